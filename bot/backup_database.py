@@ -0,0 +1,62 @@
+import argparse
+import os
+from bot import config
+from bot.services.backup import create_snapshot_sync, list_snapshots, rotate_snapshots, restore_snapshot
+
+def backup_database(args):
+    """Резервное копирование и восстановление базы данных"""
+    backup_dir = args.dir or config.BACKUP_DIR
+    if not backup_dir:
+        print("❌ Не задан каталог резервных копий (BACKUP_DIR или --dir)")
+        return 1
+
+    if args.command == "snapshot":
+        try:
+            snapshot_path = create_snapshot_sync(config.DB_PATH, backup_dir)
+            removed = rotate_snapshots(backup_dir)
+        except Exception as e:
+            print(f"❌ Ошибка при создании резервной копии: {e}")
+            return 1
+
+        print(f"✅ Создана резервная копия: {snapshot_path}")
+        for path in removed:
+            print(f"  - удалена старая копия {path}")
+        return 0
+
+    snapshots = list_snapshots(backup_dir)
+
+    if args.command == "list":
+        if not snapshots:
+            print("Резервных копий нет")
+        for created, path in snapshots:
+            print(f"  - {created:%Y-%m-%d %H:%M:%S}  {path}  ({os.path.getsize(path) // 1024} КБ)")
+        return 0
+
+    # restore
+    snapshot_path = args.snapshot or (snapshots[0][1] if snapshots else None)
+    if not snapshot_path:
+        print("❌ Резервных копий нет")
+        return 1
+
+    print(f"Восстанавливаем {config.DB_PATH} из {snapshot_path}...")
+    print("⚠️ Бот должен быть остановлен на время восстановления")
+    try:
+        previous_path = restore_snapshot(snapshot_path, config.DB_PATH)
+    except Exception as e:
+        print(f"❌ Ошибка при восстановлении: {e}")
+        return 1
+
+    if previous_path:
+        print(f"Прежняя база данных сохранена в {previous_path}")
+    print("✅ Восстановление успешно завершено!")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Резервные копии базы данных")
+    parser.add_argument("--dir", help="Каталог резервных копий (по умолчанию BACKUP_DIR)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("snapshot", help="Создать резервную копию")
+    subparsers.add_parser("list", help="Показать резервные копии")
+    restore_parser = subparsers.add_parser("restore", help="Восстановить базу данных из копии")
+    restore_parser.add_argument("snapshot", nargs="?", help="Файл копии (по умолчанию самая свежая)")
+    raise SystemExit(backup_database(parser.parse_args()))
@@ -1,16 +1,97 @@
 import os
-from dotenv import load_dotenv
+import sys
 
-# Загрузка переменных окружения из файла .env
-load_dotenv()
+# Настройки читаются из окружения (и файла .env) при первом обращении к ним,
+# поэтому импорт модуля не трогает диск: from bot import config; config.DB_PATH
+_SETTINGS = {
+    # Токен вашего бота
+    "TOKEN": lambda: os.getenv("TOKEN"),
 
-# Токен вашего бота
-TOKEN = os.getenv("TOKEN")
-if not TOKEN:
-    raise ValueError("Не найдены переменные окружения TOKEN")
+    "GROUP_CHAT_ID": lambda: os.getenv('GROUP_CHAT_ID'),  # ID группового чата
+    "TOPIC_ID": lambda: os.getenv('TOPIC_ID'),  # ID темы в групповом чате
 
-GROUP_CHAT_ID = os.getenv('GROUP_CHAT_ID')  # ID группового чата
-TOPIC_ID = os.getenv('TOPIC_ID')  # ID темы в групповом чате
+    # Путь к файлу базы данных
+    "DB_PATH": lambda: os.getenv("DB_PATH", "lunch_bot.db"),
 
-# Путь к файлу базы данных
-DB_PATH = os.getenv("DB_PATH", "lunch_bot.db")
+    # Размер пакета записи журнала событий (события пишутся в БД пачками)
+    "HISTORY_BATCH_SIZE": lambda: int(os.getenv("HISTORY_BATCH_SIZE", "100")),
+
+    # Способ доставки напоминаний по умолчанию: private (в личку), digest (одно сообщение
+    # на слот в тему группы) или both (оба варианта)
+    "DEFAULT_DELIVERY_MODE": lambda: os.getenv("DEFAULT_DELIVERY_MODE", "private"),
+
+    # Ограничение частоты команд: не более THROTTLE_RATE команд за THROTTLE_PERIOD секунд
+    "THROTTLE_RATE": lambda: int(os.getenv("THROTTLE_RATE", "5")),
+    "THROTTLE_PERIOD": lambda: float(os.getenv("THROTTLE_PERIOD", "10")),
+    # Сколько пользователей помнить в LRU-кеше ограничителя
+    "THROTTLE_MAX_USERS": lambda: int(os.getenv("THROTTLE_MAX_USERS", "10000")),
+    # Время жизни кешированных ответов на команды только для чтения (секунды)
+    "REPLY_CACHE_TTL": lambda: float(os.getenv("REPLY_CACHE_TTL", "30")),
+
+    # Сколько профилей пользователей хранить в памяти
+    "PROFILE_CACHE_SIZE": lambda: int(os.getenv("PROFILE_CACHE_SIZE", "5000")),
+
+    # Сколько секунд при остановке ждать завершения уже начатых отправок
+    "SHUTDOWN_TIMEOUT": lambda: float(os.getenv("SHUTDOWN_TIMEOUT", "10")),
+
+    # Резервные копии БД: каталог (пусто - копии не создаются), период в часах,
+    # сколько последних копий хранить и сколько дней хранить по одной копии за день
+    "BACKUP_DIR": lambda: os.getenv("BACKUP_DIR", ""),
+    "BACKUP_INTERVAL_HOURS": lambda: float(os.getenv("BACKUP_INTERVAL_HOURS", "6")),
+    "BACKUP_KEEP": lambda: int(os.getenv("BACKUP_KEEP", "10")),
+    "BACKUP_KEEP_DAYS": lambda: int(os.getenv("BACKUP_KEEP_DAYS", "14")),
+    # Сколько страниц БД копировать за один шаг (между шагами БД доступна для записи)
+    "BACKUP_PAGES": lambda: int(os.getenv("BACKUP_PAGES", "64")),
+
+    # Диагностика задержек event loop и профилирование (включается DIAGNOSTICS=1)
+    "DIAGNOSTICS": lambda: os.getenv("DIAGNOSTICS", "").lower() in ("1", "true", "yes"),
+    # Каталог для отчетов о зависаниях и профилей в формате flamegraph
+    "DIAGNOSTICS_DIR": lambda: os.getenv("DIAGNOSTICS_DIR", "diagnostics"),
+    # Порог (секунды), после которого event loop считается зависшим
+    "DIAGNOSTICS_STALL_THRESHOLD": lambda: float(os.getenv("DIAGNOSTICS_STALL_THRESHOLD", "0.25")),
+    # Допустимое опоздание (секунды) пробуждения минутного цикла планировщика
+    "DIAGNOSTICS_LAG_THRESHOLD": lambda: float(os.getenv("DIAGNOSTICS_LAG_THRESHOLD", "1")),
+    # Период (секунды) снятия стека профилировщиком
+    "DIAGNOSTICS_SAMPLE_INTERVAL": lambda: float(os.getenv("DIAGNOSTICS_SAMPLE_INTERVAL", "0.01")),
+}
+
+_env_loaded = False
+
+
+def load_env():
+    """Загрузка переменных окружения из файла .env (один раз)"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def __getattr__(name):
+    """Чтение настройки при первом обращении (значение запоминается в модуле)"""
+    loader = _SETTINGS.get(name)
+    if loader is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    load_env()
+    value = loader()
+    globals()[name] = value
+    return value
+
+
+def validate():
+    """
+    Проверка всех настроек
+    Raises:
+        ValueError: если обязательная настройка не задана или значение некорректно
+    """
+    values = {}
+    for name in _SETTINGS:
+        try:
+            # Уже прочитанные или заданные в коде значения не перечитываются
+            values[name] = getattr(sys.modules[__name__], name)
+        except ValueError as e:
+            raise ValueError(f"Некорректное значение {name}: {e}") from e
+
+    if not values["TOKEN"]:
+        raise ValueError("Не найдены переменные окружения TOKEN")
@@ -1,18 +1,36 @@
+import os
 import sqlite3
 import logging
+from urllib.request import pathname2url
+from bot import config
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+def connect_read_only(db_file):
+    """
+    Подключение к существующей БД только на чтение (файл не создается и не изменяется)
+    Raises:
+        FileNotFoundError: если файла БД нет
+    """
+    if not os.path.isfile(db_file):
+        raise FileNotFoundError(f"файл базы данных {db_file} не найден")
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_file))}?mode=ro", uri=True)
 
 class Database:
+    # Колонки lunch_schedule, которые можно обновлять через update_user_fields
+    USER_FIELDS = ("username", "first_name", "last_name", "lunch_time", "notifications_enabled", "delivery_mode")
+
     def __init__(self, db_file):
         self.connection = sqlite3.connect(db_file)
         self.cursor = self.connection.cursor()
         self._create_tables()
 
+    @classmethod
+    def open_read_only(cls, db_file):
+        """Открытие существующей БД только на чтение, без создания таблиц (отчеты, проверки)"""
+        database = cls.__new__(cls)
+        database.connection = connect_read_only(db_file)
+        database.cursor = database.connection.cursor()
+        return database
+
     def _create_tables(self):
         """Создание необходимых таблиц, если они не существуют"""
         # Таблица пользователей с расписанием обедов
@@ -23,7 +41,8 @@ class Database:
                   first_name TEXT,
                   last_name TEXT,
                   lunch_time TEXT,
-                  notifications_enabled INTEGER DEFAULT 1
+                  notifications_enabled INTEGER DEFAULT 1,
+                  delivery_mode TEXT
               )
           ''')
         try:
@@ -31,6 +50,12 @@ class Database:
             self.connection.commit()
         except sqlite3.OperationalError:
             pass
+        # Способ доставки напоминаний (NULL - способ по умолчанию из настроек)
+        try:
+            self.cursor.execute('ALTER TABLE lunch_schedule ADD COLUMN delivery_mode TEXT')
+            self.connection.commit()
+        except sqlite3.OperationalError:
+            pass
 
         # Таблица для хранения информации о закрепленном сообщении
         self.cursor.execute('''
@@ -40,38 +65,108 @@ class Database:
                   date TEXT
               )
           ''')
+        # Последний отрисованный текст расписания и его версия: после перезапуска бот
+        # продолжает работать с тем же сообщением и редактирует его, только если текст изменился
+        for column in ('text TEXT', 'version INTEGER DEFAULT 0'):
+            try:
+                self.cursor.execute(f'ALTER TABLE pinned_messages ADD COLUMN {column}')
+                self.connection.commit()
+            except sqlite3.OperationalError:
+                pass
+
+        # Журнал событий (только добавление, записи никогда не перезаписываются)
+        self.cursor.execute('''
+              CREATE TABLE IF NOT EXISTS lunch_events (
+                  id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  ts TEXT NOT NULL,
+                  event_type TEXT NOT NULL,
+                  user_id INTEGER,
+                  lunch_time TEXT,
+                  details TEXT
+              )
+          ''')
+
+        # Сводные таблицы, обновляемые инкрементально при записи событий
+        self.cursor.execute('''
+              CREATE TABLE IF NOT EXISTS lunch_stats_daily (
+                  day TEXT NOT NULL,
+                  event_type TEXT NOT NULL,
+                  count INTEGER NOT NULL DEFAULT 0,
+                  PRIMARY KEY (day, event_type)
+              )
+          ''')
+        self.cursor.execute('''
+              CREATE TABLE IF NOT EXISTS lunch_stats_slot (
+                  month TEXT NOT NULL,
+                  event_type TEXT NOT NULL,
+                  lunch_time TEXT NOT NULL,
+                  count INTEGER NOT NULL DEFAULT 0,
+                  PRIMARY KEY (month, event_type, lunch_time)
+              )
+          ''')
+        self.cursor.execute('''
+              CREATE TABLE IF NOT EXISTS lunch_stats_user (
+                  user_id INTEGER NOT NULL,
+                  event_type TEXT NOT NULL,
+                  count INTEGER NOT NULL DEFAULT 0,
+                  last_ts TEXT,
+                  PRIMARY KEY (user_id, event_type)
+              )
+          ''')
 
         self.connection.commit()
 
     def set_lunch_time(self, user_id, username, first_name, last_name, lunch_time):
         """Установка времени обеда для пользователя с сохранением настроек уведомлений"""
         try:
-            # Получаем текущие настройки уведомлений
-            self.cursor.execute(
-                'SELECT notifications_enabled FROM lunch_schedule WHERE user_id = ?',
-                (user_id,)
-            )
-            current_notifications = self.cursor.fetchone()  # ✅ ДОБАВИТЬ .fetchone()
-
-            # Если пользователь уже существует, сохраняем его настройки уведомлений
-            notifications_enabled = current_notifications[0] if current_notifications else 1
-
+            # Существующая строка обновляется на месте, поэтому настройки пользователя сохраняются
             self.cursor.execute('''
-                  INSERT OR REPLACE INTO lunch_schedule 
-                  (user_id, username, first_name, last_name, lunch_time, notifications_enabled) 
-                  VALUES (?, ?, ?, ?, ?, ?)
-              ''', (user_id, username, first_name, last_name, lunch_time, notifications_enabled))
+                  INSERT INTO lunch_schedule (user_id, username, first_name, last_name, lunch_time)
+                  VALUES (?, ?, ?, ?, ?)
+                  ON CONFLICT (user_id) DO UPDATE SET
+                      username = excluded.username,
+                      first_name = excluded.first_name,
+                      last_name = excluded.last_name,
+                      lunch_time = excluded.lunch_time
+              ''', (user_id, username, first_name, last_name, lunch_time))
             self.connection.commit()
             return True
         except Exception as e:
             logging.error(f"Ошибка при установке времени обеда для пользователя {user_id}: {e}")
             return False
 
-    def get_lunch_time(self, user_id):
-        """Получение времени обеда пользователя"""
-        self.cursor.execute('SELECT lunch_time FROM lunch_schedule WHERE user_id = ?', (user_id,))
-        result = self.cursor.fetchone()
-        return result[0] if result else None
+    def get_user_profile(self, user_id):
+        """Получение всех данных пользователя одним запросом"""
+        self.cursor.execute('''
+              SELECT user_id, username, first_name, last_name, lunch_time, notifications_enabled, delivery_mode
+              FROM lunch_schedule
+              WHERE user_id = ?
+          ''', (user_id,))
+        return self.cursor.fetchone()
+
+    def update_user_fields(self, user_id, fields):
+        """
+        Обновление только переданных колонок пользователя
+        Args:
+            fields: словарь {колонка: значение}
+        Returns:
+            bool: True если строка обновлена
+        """
+        columns = [column for column in fields if column in self.USER_FIELDS]
+        if not columns:
+            return False
+
+        try:
+            assignments = ", ".join(f"{column} = ?" for column in columns)
+            self.cursor.execute(
+                f'UPDATE lunch_schedule SET {assignments} WHERE user_id = ?',
+                [fields[column] for column in columns] + [user_id]
+            )
+            self.connection.commit()
+            return self.cursor.rowcount > 0
+        except Exception as e:
+            logging.error(f"Ошибка при обновлении данных пользователя {user_id}: {e}")
+            return False
 
     def get_users_by_lunch_time(self, lunch_time):
         """Получение всех пользователей с определенным временем обеда"""
@@ -91,18 +186,25 @@ class Database:
           ''')
         return self.cursor.fetchall()
 
-    def delete_lunch_time(self, user_id):
-        """Удаление времени обеда для пользователя"""
-        with self.connection:
-            self.cursor.execute("DELETE FROM lunch_schedule WHERE user_id = ?", (user_id,))
-            return True
-
-    def set_pinned_message(self, message_id, date):
+    def set_pinned_message(self, message_id, date, text=None):
         """Сохранение информации о закрепленном сообщении"""
         self.cursor.execute('''
-              INSERT OR REPLACE INTO pinned_messages (id, message_id, date) 
-              VALUES (1, ?, ?)
-          ''', (message_id, date))
+              INSERT OR REPLACE INTO pinned_messages (id, message_id, date, text, version) 
+              VALUES (1, ?, ?, ?, 1)
+          ''', (message_id, date, text))
+        self.connection.commit()
+
+    def get_pinned_state(self):
+        """Получение закрепленного сообщения вместе с последним отрисованным текстом и версией"""
+        self.cursor.execute('SELECT message_id, date, text, version FROM pinned_messages WHERE id = 1')
+        return self.cursor.fetchone()
+
+    def set_pinned_text(self, text):
+        """Сохранение нового текста закрепленного сообщения с увеличением версии"""
+        self.cursor.execute(
+            'UPDATE pinned_messages SET text = ?, version = COALESCE(version, 0) + 1 WHERE id = 1',
+            (text,)
+        )
         self.connection.commit()
 
     def get_pinned_message(self):
@@ -111,46 +213,6 @@ class Database:
         result = self.cursor.fetchone()
         return result if result else None
 
-    def get_user_lunch_time_with_notifications(self, user_id):
-        """Получить время обеда и статус уведомлений для пользователя"""
-        try:
-            self.cursor.execute(
-                "SELECT lunch_time, notifications_enabled FROM lunch_schedule WHERE user_id = ?",
-                (user_id,)
-            )
-            result = self.cursor.fetchone()
-            if result:
-                return result[0], bool(result[1])  # Возвращаем lunch_time, notifications_enabled
-            else:
-                return None, True  # По умолчанию уведомления включены
-        except Exception as e:
-            logging.error(f"Ошибка при получении данных пользователя {user_id}: {e}")
-            return None, True
-
-    def toggle_notifications(self, user_id):
-        """Переключить статус уведомлений для пользователя"""
-        try:
-            # Получаем текущий статус
-            current_status = self.cursor.execute(
-                'SELECT notifications_enabled FROM lunch_schedule WHERE user_id = ?',
-                (user_id,)
-            ).fetchone()
-
-            if current_status is None:
-                return False
-
-            # Переключаем статус
-            new_status = 0 if current_status[0] else 1
-            self.cursor.execute(
-                'UPDATE lunch_schedule SET notifications_enabled = ? WHERE user_id = ?',
-                (new_status, user_id)
-            )
-            self.connection.commit()
-            return True
-        except Exception as e:
-            logging.error(f"Ошибка при переключении уведомлений: {e}")
-            return False
-
     def remove_user_from_schedule(self, user_id):
         """Удалить пользователя из расписания"""
         try:
@@ -164,7 +226,7 @@ class Database:
     def get_users_by_lunch_time_with_notifications(self, lunch_time):
         """Получить пользователей по времени обеда с учетом включенных уведомлений"""
         self.cursor.execute(
-            'SELECT user_id, username, first_name, last_name FROM lunch_schedule WHERE lunch_time = ? AND notifications_enabled = 1',
+            'SELECT user_id, username, first_name, last_name, delivery_mode FROM lunch_schedule WHERE lunch_time = ? AND notifications_enabled = 1',
             (lunch_time,)
         )
         return self.cursor.fetchall()
@@ -174,6 +236,98 @@ class Database:
         self.cursor.execute('DELETE FROM pinned_messages WHERE id = 1')
         self.connection.commit()
 
+    def record_events(self, events):
+        """
+        Пакетная запись событий в журнал с инкрементальным обновлением сводных таблиц
+        Args:
+            events: список кортежей (ts, event_type, user_id, lunch_time, details)
+        Returns:
+            bool: True если пакет записан
+        """
+        if not events:
+            return True
+
+        # Агрегируем пакет в памяти, чтобы каждая строка сводки обновлялась один раз
+        daily = {}
+        slots = {}
+        users = {}
+        for ts, event_type, user_id, lunch_time, _ in events:
+            day_key = (ts[:10], event_type)
+            daily[day_key] = daily.get(day_key, 0) + 1
+
+            if lunch_time:
+                slot_key = (ts[:7], event_type, lunch_time)
+                slots[slot_key] = slots.get(slot_key, 0) + 1
+
+            if user_id is not None:
+                count, last_ts = users.get((user_id, event_type), (0, ts))
+                users[(user_id, event_type)] = (count + 1, max(last_ts, ts))
+
+        try:
+            with self.connection:
+                self.cursor.executemany('''
+                      INSERT INTO lunch_events (ts, event_type, user_id, lunch_time, details)
+                      VALUES (?, ?, ?, ?, ?)
+                  ''', events)
+                self.cursor.executemany('''
+                      INSERT INTO lunch_stats_daily (day, event_type, count) VALUES (?, ?, ?)
+                      ON CONFLICT (day, event_type) DO UPDATE SET count = count + excluded.count
+                  ''', [(day, event_type, count) for (day, event_type), count in daily.items()])
+                self.cursor.executemany('''
+                      INSERT INTO lunch_stats_slot (month, event_type, lunch_time, count) VALUES (?, ?, ?, ?)
+                      ON CONFLICT (month, event_type, lunch_time) DO UPDATE SET count = count + excluded.count
+                  ''', [key + (count,) for key, count in slots.items()])
+                self.cursor.executemany('''
+                      INSERT INTO lunch_stats_user (user_id, event_type, count, last_ts) VALUES (?, ?, ?, ?)
+                      ON CONFLICT (user_id, event_type) DO UPDATE SET
+                          count = count + excluded.count,
+                          last_ts = MAX(last_ts, excluded.last_ts)
+                  ''', [(user_id, event_type, count, last_ts)
+                        for (user_id, event_type), (count, last_ts) in users.items()])
+            return True
+        except Exception as e:
+            logging.error(f"Ошибка при записи журнала событий ({len(events)} шт.): {e}")
+            return False
+
+    def get_top_slots(self, month, event_type, limit=1):
+        """Самые загруженные минуты месяца (формат ГГГГ-ММ) по типу события"""
+        self.cursor.execute('''
+              SELECT lunch_time, count FROM lunch_stats_slot
+              WHERE month = ? AND event_type = ?
+              ORDER BY count DESC, lunch_time
+              LIMIT ?
+          ''', (month, event_type, limit))
+        return self.cursor.fetchall()
+
+    def get_period_stats(self, first_day, last_day):
+        """Количество событий каждого типа за период (даты ГГГГ-ММ-ДД включительно)"""
+        self.cursor.execute('''
+              SELECT event_type, SUM(count) FROM lunch_stats_daily
+              WHERE day BETWEEN ? AND ?
+              GROUP BY event_type
+          ''', (first_day, last_day))
+        return dict(self.cursor.fetchall())
+
+    def get_user_stats(self, user_id):
+        """Количество событий каждого типа для пользователя"""
+        self.cursor.execute(
+            'SELECT event_type, count FROM lunch_stats_user WHERE user_id = ?',
+            (user_id,)
+        )
+        return dict(self.cursor.fetchall())
+
     def close(self):
         """Закрытие соединения с базой данных"""
-        self.connection.close()
\ No newline at end of file
+        self.connection.close()
+
+
+# Общее соединение процесса: обработчики, планировщик и журнал работают в одном event loop
+database = None
+
+
+def get_database():
+    """Получение общего подключения к БД (открывается при первом обращении)"""
+    global database
+    if database is None:
+        database = Database(config.DB_PATH)
+    return database
\ No newline at end of file
@@ -1,6 +1,6 @@
 from aiogram import types, Dispatcher
 from aiogram.filters import Command
-from bot.handlers.lunch import cmd_remove, cmd_notifications, cmd_lunch
+from bot.handlers.lunch import cmd_remove, cmd_notifications, cmd_lunch, cmd_stats, cmd_delivery
 
 # Обработчик команды /start
 async def cmd_start(message: types.Message):
@@ -18,6 +18,8 @@ async def cmd_help(message: types.Message):
 /lunch ЧЧ:ММ - Установить время обеда (например: /lunch 13:30)
 /notifications - Включить/выключить уведомления
 /remove - Удалить себя из расписания
+/delivery private|digest|both - Напоминания в личку, общим сообщением в группе или оба варианта
+/stats - Статистика обедов за месяц
 
 📅 **Особенности работы:**
 • Уведомления приходят только в рабочие дни (пн-пт)
@@ -33,3 +35,5 @@ def register_common_handlers(dp: Dispatcher):
     dp.message.register(cmd_notifications, Command("notifications"))
     dp.message.register(cmd_lunch, Command("lunch"))
     dp.message.register(cmd_remove, Command("remove"))
+    dp.message.register(cmd_stats, Command("stats"))
+    dp.message.register(cmd_delivery, Command("delivery"))
@@ -1,14 +1,19 @@
 import re
 from aiogram import types, Dispatcher
 from aiogram.filters import Command
-from bot.database import Database
-from bot.config import DB_PATH
-from datetime import datetime, timedelta
+from bot.database import get_database
+from bot.services.history import (
+    get_history_log, EVENT_LUNCH_SET, EVENT_LUNCH_REMOVED, EVENT_NOTIFICATIONS_ON,
+    EVENT_NOTIFICATIONS_OFF, EVENT_REMINDER_SENT, EVENT_PRE_REMINDER_SENT, EVENT_REMINDER_FAILED,
+    EVENT_DELIVERY_CHANGED
+)
+from bot.middlewares.throttling import ReplyBuffer
+from bot.services.profiles import get_profile_cache
+from bot.services.digest import resolve_delivery_mode, DELIVERY_MODES, DELIVERY_PRIVATE, DELIVERY_DIGEST, DELIVERY_BOTH
+from bot.services.clock import get_clock
+from datetime import timedelta
 import logging
 
-# Инициализация базы данных
-db = Database(DB_PATH)
-
 # Регулярное выражение для проверки формата времени
 TIME_PATTERN = r'^([01]?[0-9]|2[0-3]):([0-5][0-9])$'
 
@@ -27,7 +32,7 @@ def _format_display_name(username, first_name, last_name):
 def _check_time_until_lunch(time_str):
     """Проверяет, сколько времени осталось до обеда сегодня"""
     try:
-        now = datetime.now()
+        now = get_clock().now()
         lunch_hour, lunch_minute = map(int, time_str.split(':'))
 
         # Время обеда сегодня
@@ -49,25 +54,31 @@ def _check_time_until_lunch(time_str):
         logging.error(f"Ошибка при проверке времени до обеда: {e}")
         return None
 
+async def _reply(message, replies, text, parse_mode=None):
+    """Ответ пользователю: через буфер ответов ограничителя или сразу отдельным сообщением"""
+    if replies is not None:
+        replies.add(text, parse_mode)
+    else:
+        await message.bot.send_message(message.from_user.id, text, parse_mode=parse_mode)
+
 # Обработчик команды /lunch
-async def cmd_lunch(message: types.Message):
+async def cmd_lunch(message: types.Message, replies: ReplyBuffer = None):
     args = message.text.split()
     user_id = message.from_user.id
-    bot = message.bot
 
     if len(args) == 1:
         # Если команда без аргументов, показываем текущее время обеда
-        lunch_time = db.get_lunch_time(user_id)
-        if lunch_time:
-            await bot.send_message(user_id, f"Ваше текущее время обеда: {lunch_time}")
+        profile = get_profile_cache().get(user_id)
+        if profile and profile.lunch_time:
+            await _reply(message, replies, f"Ваше текущее время обеда: {profile.lunch_time}")
         else:
-            await bot.send_message(user_id, "У вас еще не установлено время обеда. Используйте команду /lunch ЧЧ:ММ для установки.")
+            await _reply(message, replies, "У вас еще не установлено время обеда. Используйте команду /lunch ЧЧ:ММ для установки.")
         return
 
     # Проверяем формат времени
     time_str = args[1]
     if not re.match(TIME_PATTERN, time_str):
-        await bot.send_message(user_id, "Неверный формат времени. Используйте формат ЧЧ:ММ, например: /lunch 13:30")
+        await _reply(message, replies, "Неверный формат времени. Используйте формат ЧЧ:ММ, например: /lunch 13:30")
         return
 
     # Получаем информацию о пользователе
@@ -76,7 +87,16 @@ async def cmd_lunch(message: types.Message):
     last_name = message.from_user.last_name or ""
 
     # Сохраняем время обеда с полной информацией о пользователе
-    db.set_lunch_time(user_id, username, first_name, last_name, time_str)
+    profiles = get_profile_cache()
+    profile = profiles.get(user_id)
+    previous_time = profile.lunch_time if profile else None
+    if not profiles.set_lunch_time(user_id, username, first_name, last_name, time_str):
+        await _reply(message, replies, "❌ Ошибка при сохранении времени обеда.")
+        return
+
+    # Повторная установка того же времени изменением расписания не считается
+    if previous_time != time_str:
+        get_history_log().record(EVENT_LUNCH_SET, user_id=user_id, lunch_time=time_str)
 
     # Форматируем имя для ответа
     display_name = _format_display_name(username, first_name, last_name)
@@ -86,8 +106,8 @@ async def cmd_lunch(message: types.Message):
 
     if time_until_lunch is None:
         # Время обеда уже прошло сегодня
-        await bot.send_message(
-            user_id,
+        await _reply(
+            message, replies,
             f"✅ Время обеда установлено на {time_str}\n"
             f"Уведомления придут на следующий рабочий день"
         )
@@ -102,8 +122,8 @@ async def cmd_lunch(message: types.Message):
         else:
             time_str_left = f"{seconds} сек."
 
-        await bot.send_message(
-            user_id,
+        await _reply(
+            message, replies,
             f"✅ Время обеда установлено на {time_str}\n\n"
             f"⏰ До обеда осталось {time_str_left}!\n"
         )
@@ -118,8 +138,8 @@ async def cmd_lunch(message: types.Message):
         else:
             time_left_str = f"{minutes_left} мин."
 
-        await bot.send_message(
-            user_id,
+        await _reply(
+            message, replies,
             f"✅ Время обеда установлено на {time_str}\n\n"
             f"⏰ До обеда сегодня: {time_left_str}\n"
             f"🔄 Изменения вступят в силу автоматически."
@@ -128,45 +148,122 @@ async def cmd_lunch(message: types.Message):
     logging.info(f"Пользователь {user_id} ({display_name}) установил время обеда: {time_str}")
 
 # Команда /notifications
-async def cmd_notifications(message: types.Message):
+async def cmd_notifications(message: types.Message, replies: ReplyBuffer = None):
     """Команда для включения/выключения уведомлений"""
     user_id = message.from_user.id
-    bot = message.bot  # 🆕 Получаем bot
-    lunch_time, notifications_enabled = db.get_user_lunch_time_with_notifications(user_id)
+    profile = get_profile_cache().get(user_id)
 
-    if lunch_time is None:
-        await bot.send_message(user_id, "❌ Вы не зарегистрированы в расписании. Используйте /lunch ЧЧ:ММ для установки времени обеда.")
+    if profile is None:
+        await _reply(message, replies, "❌ Вы не зарегистрированы в расписании. Используйте /lunch ЧЧ:ММ для установки времени обеда.")
         return
 
     # Переключаем уведомления
-    if db.toggle_notifications(user_id):
-        new_status = not notifications_enabled
-        status_text = "включены ✅" if new_status else "выключены ❌"
-        await bot.send_message(user_id, f"🔔 Уведомления {status_text}")
-
+    new_status = get_profile_cache().toggle_notifications(user_id)
+    if new_status is not None:
+        get_history_log().record(
+            EVENT_NOTIFICATIONS_ON if new_status else EVENT_NOTIFICATIONS_OFF,
+            user_id=user_id,
+            lunch_time=profile.lunch_time
+        )
         if new_status:
-            await bot.send_message(user_id, "Теперь вы будете получать напоминания о времени обеда.")
+            status_text = "включены ✅\n\nТеперь вы будете получать напоминания о времени обеда."
         else:
-            await bot.send_message(user_id, "Вы больше не будете получать напоминания о времени обеда.")
+            status_text = "выключены ❌\n\nВы больше не будете получать напоминания о времени обеда."
+        await _reply(message, replies, f"🔔 Уведомления {status_text}")
     else:
-        await bot.send_message(user_id, "❌ Ошибка при изменении настроек уведомлений.")
+        await _reply(message, replies, "❌ Ошибка при изменении настроек уведомлений.")
 
 # Команда /remove
-async def cmd_remove(message: types.Message):
+async def cmd_remove(message: types.Message, replies: ReplyBuffer = None):
     """Команда для удаления себя из расписания"""
     user_id = message.from_user.id
-    bot = message.bot  # 🆕 Получаем bot
-    lunch_time, _ = db.get_user_lunch_time_with_notifications(user_id)
+    profile = get_profile_cache().get(user_id)
+
+    if profile is None:
+        await _reply(message, replies, "❌ Вы не зарегистрированы в расписании обедов.")
+        return
+
+    if get_profile_cache().remove(user_id):
+        get_history_log().record(EVENT_LUNCH_REMOVED, user_id=user_id, lunch_time=profile.lunch_time)
+        await _reply(message, replies, "✅ Вы успешно удалены из расписания обедов.\n"
+                                       "Используйте /lunch ЧЧ:ММ для возвращения.")
+    else:
+        await _reply(message, replies, "❌ Ошибка при удалении из расписания.")
+
+# Описания способов доставки напоминаний
+DELIVERY_TITLES = {
+    DELIVERY_PRIVATE: "личные сообщения",
+    DELIVERY_DIGEST: "общее сообщение в теме группы",
+    DELIVERY_BOTH: "личные сообщения и общее сообщение в теме группы",
+}
+
+# Команда /delivery
+async def cmd_delivery(message: types.Message, replies: ReplyBuffer = None):
+    """Команда для выбора способа доставки напоминаний"""
+    args = message.text.split()
+    user_id = message.from_user.id
 
-    if lunch_time is None:
-        await bot.send_message(user_id, "❌ Вы не зарегистрированы в расписании обедов.")
+    profile = get_profile_cache().get(user_id)
+    if profile is None:
+        await _reply(message, replies, "❌ Вы не зарегистрированы в расписании. Используйте /lunch ЧЧ:ММ для установки времени обеда.")
         return
 
-    if db.remove_user_from_schedule(user_id):
-        await bot.send_message(user_id, "✅ Вы успешно удалены из расписания обедов.\n"
-                                        "Используйте /lunch ЧЧ:ММ для возвращения.")
+    if len(args) == 1:
+        # Без аргументов показываем текущий способ доставки
+        mode = resolve_delivery_mode(profile.delivery_mode)
+        await _reply(
+            message, replies,
+            f"📬 Напоминания приходят: {DELIVERY_TITLES[mode]}\n"
+            f"Изменить: /delivery {' | '.join(DELIVERY_MODES)}"
+        )
+        return
+
+    mode = args[1].lower()
+    if mode not in DELIVERY_MODES:
+        await _reply(message, replies, f"Неверный способ доставки. Используйте: /delivery {' | '.join(DELIVERY_MODES)}")
+        return
+
+    if get_profile_cache().set_delivery_mode(user_id, mode):
+        get_history_log().record(EVENT_DELIVERY_CHANGED, user_id=user_id, lunch_time=profile.lunch_time, details=mode)
+        await _reply(message, replies, f"✅ Напоминания будут приходить: {DELIVERY_TITLES[mode]}")
     else:
-        await bot.send_message(user_id, "❌ Ошибка при удалении из расписания.")
+        await _reply(message, replies, "❌ Ошибка при изменении способа доставки.")
+
+# Команда /stats
+async def cmd_stats(message: types.Message, replies: ReplyBuffer = None):
+    """Статистика обедов за текущий месяц (по сводным таблицам журнала событий)"""
+    user_id = message.from_user.id
+
+    # Дописываем буфер, чтобы статистика учитывала последние события
+    get_history_log().flush()
+    db = get_database()
+
+    today = get_clock().now()
+    month = today.strftime("%Y-%m")
+    month_stats = db.get_period_stats(f"{month}-01", today.strftime("%Y-%m-%d"))
+    today_stats = db.get_period_stats(today.strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d"))
+    user_stats = db.get_user_stats(user_id)
+
+    text = f"📊 <b>Статистика обедов за {month}</b>\n\n"
+    text += f"🍽️ Напоминаний об обеде: {month_stats.get(EVENT_REMINDER_SENT, 0)}\n"
+    text += f"⏰ Предварительных напоминаний: {month_stats.get(EVENT_PRE_REMINDER_SENT, 0)}\n"
+    text += f"⚠️ Ошибок отправки: {month_stats.get(EVENT_REMINDER_FAILED, 0)}\n"
+    text += f"🔄 Изменений расписания: {month_stats.get(EVENT_LUNCH_SET, 0)}\n"
+
+    busiest = db.get_top_slots(month, EVENT_REMINDER_SENT)
+    if busiest:
+        busiest_time, busiest_count = busiest[0]
+        text += f"\n🔥 Самая загруженная минута: <b>{busiest_time}</b> ({busiest_count} напоминаний)\n"
+
+    popular = db.get_top_slots(month, EVENT_LUNCH_SET, limit=3)
+    if popular:
+        popular_text = ", ".join(f"{lunch_time} ({count})" for lunch_time, count in popular)
+        text += f"⭐ Чаще всего выбирают: {popular_text}\n"
+
+    text += f"\n📅 Сегодня отправлено напоминаний: {today_stats.get(EVENT_REMINDER_SENT, 0)}\n"
+    text += f"👤 Вы получили напоминаний: {user_stats.get(EVENT_REMINDER_SENT, 0)}"
+
+    await _reply(message, replies, text, parse_mode="HTML")
 
 # Функция регистрации обработчиков
 def register_lunch_handlers(dp: Dispatcher):
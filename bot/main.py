@@ -1,10 +1,12 @@
+import argparse
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from config import TOKEN
-from bot.handlers.common import register_common_handlers
-from bot.handlers.lunch import register_lunch_handlers
-from bot.services.scheduler_instance import init_scheduler, LunchScheduler
+import os
+import sys
+import time
+from contextlib import contextmanager
+from bot import config
+from bot.database import connect_read_only, get_database
 
 # Настройка логирования
 logging.basicConfig(
@@ -12,44 +14,137 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-# Инициализация бота и диспетчера
-bot = Bot(token=TOKEN)
-dp = Dispatcher()
+@contextmanager
+def startup_phase(name):
+    """Замер длительности этапа запуска"""
+    started = time.perf_counter()
+    yield
+    logging.info(f"Этап запуска «{name}»: {(time.perf_counter() - started) * 1000:.0f} мс")
+
+def check_database(path):
+    """
+    Быстрая проверка файла БД только на чтение (файл не создается и не изменяется)
+    Returns:
+        tuple: (список проблем, количество пользователей в расписании)
+    """
+    connection = connect_read_only(path)
+    try:
+        rows = [row[0] for row in connection.execute('PRAGMA quick_check').fetchall()]
+        if rows != ['ok']:
+            return rows, 0
+        users_count = connection.execute('SELECT COUNT(*) FROM lunch_schedule').fetchone()[0]
+        return [], users_count
+    finally:
+        connection.close()
+
+def check():
+    """
+    Проверка настроек и базы данных без запуска бота
+    Returns:
+        int: код завершения (0 - все в порядке)
+    """
+    try:
+        with startup_phase("настройки"):
+            config.validate()
+    except ValueError as e:
+        logging.error(f"Ошибка в настройках: {e}")
+        return 1
+
+    if not os.path.isfile(config.DB_PATH):
+        logging.error(f"Файл базы данных {config.DB_PATH} не найден")
+        return 1
+
+    try:
+        with startup_phase("база данных"):
+            problems, users_count = check_database(config.DB_PATH)
+    except Exception as e:
+        logging.error(f"Ошибка при открытии базы данных {config.DB_PATH}: {e}")
+        return 1
+
+    if problems:
+        logging.error(f"База данных {config.DB_PATH} повреждена: {'; '.join(problems)}")
+        return 1
+
+    if not config.GROUP_CHAT_ID or not config.TOPIC_ID:
+        logging.warning("GROUP_CHAT_ID или TOPIC_ID не настроены, групповое расписание отправляться не будет")
+
+    logging.info(f"Проверка пройдена: база данных {config.DB_PATH}, пользователей в расписании: {users_count}")
+    return 0
 
 # Функция запуска бота
 async def main():
     logging.info("Запуск бота...")
+    started = time.perf_counter()
 
-    # Инициализация и запуск планировщика
-    scheduler = init_scheduler(bot)
-    scheduler.start()
-    logging.info("Планировщик запущен")
+    with startup_phase("настройки"):
+        config.validate()
 
-    # Инициализация и запуск планировщика обедов
+    # aiogram и обработчики импортируются только при запуске бота, чтобы --check
+    # и служебные скрипты не тратили на них время
+    with startup_phase("импорт модулей"):
+        from aiogram import Bot, Dispatcher
+        from bot.handlers.common import register_common_handlers
+        from bot.handlers.lunch import register_lunch_handlers
+        from bot.middlewares.throttling import ThrottlingMiddleware
+        from bot.middlewares.profiles import ProfileMiddleware
+        from bot.services.scheduler_instance import LunchScheduler
+        from bot.services.backup import SnapshotScheduler
+        from bot.services.diagnostics import get_diagnostics
+        from bot.middlewares.diagnostics import DiagnosticsMiddleware
+
+    # Инициализация бота и диспетчера
+    with startup_phase("бот"):
+        bot = Bot(token=config.TOKEN)
+        dp = Dispatcher()
+
+    # Диагностика задержек event loop и профилирование (DIAGNOSTICS=1)
+    diagnostics = get_diagnostics()
+    if diagnostics:
+        diagnostics.start()
+
+    with startup_phase("обработчики"):
+        if diagnostics:
+            # Первым в цепочке, чтобы в профиль попадало и время остальных middleware
+            dp.message.middleware(DiagnosticsMiddleware())
+        # Ограничение частоты команд для каждого пользователя
+        dp.message.middleware(ThrottlingMiddleware())
+        # Обновление имен пользователей по входящим сообщениям (пишет в БД только изменения)
+        dp.message.middleware(ProfileMiddleware())
+
+        # Регистрация всех обработчиков
+        register_common_handlers(dp)
+        register_lunch_handlers(dp)
+
+    with startup_phase("база данных"):
+        get_database()
+
+    # Планировщик обедов (отправка расписания и напоминаний) работает в фоне
+    # и не задерживает начало приема обновлений
     lunch_scheduler = LunchScheduler(bot)
-    asyncio.create_task(lunch_scheduler.start())
+    lunch_scheduler_task = asyncio.create_task(lunch_scheduler.start())
     logging.info("Планировщик обедов запущен")
 
-    # Регистрация всех обработчиков
-    register_common_handlers(dp)
-    register_lunch_handlers(dp)
-    logging.info("Все обработчики зарегистрированы")
+    # Резервное копирование БД без остановки бота
+    snapshot_scheduler = None
+    if config.BACKUP_DIR:
+        snapshot_scheduler = SnapshotScheduler()
+        asyncio.create_task(snapshot_scheduler.start())
+        logging.info(f"Резервное копирование БД включено: {config.BACKUP_DIR}")
 
     try:
         # Запуск бота
-        logging.info("Бот готов к работе")
+        logging.info(f"Бот готов к работе за {(time.perf_counter() - started) * 1000:.0f} мс")
         await dp.start_polling(bot)
     finally:
-        # Остановка планировщика при любом завершении
-        await lunch_scheduler.stop()
-        # Открепляем и удаляем сообщение при остановке бота
-        await lunch_scheduler.cleanup_on_shutdown()
-        logging.info("Бот очищен")
-        try:
-            scheduler.shutdown(wait=False)
-            logging.info("Планировщик остановлен")
-        except:
-            pass
+        # Остановка планировщика при любом завершении: ждем завершения начатой рассылки,
+        # закрепленное сообщение остается и будет подхвачено при следующем запуске
+        if not await lunch_scheduler.stop():
+            lunch_scheduler_task.cancel()
+        logging.info("Планировщик обедов остановлен")
+        if snapshot_scheduler:
+            await snapshot_scheduler.stop()
+        if diagnostics:
+            diagnostics.stop()
 
         # Закрытие сессии бота
         try:
@@ -59,9 +154,16 @@ async def main():
             pass
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Бот для управления расписанием обедов")
+    parser.add_argument("--check", action="store_true", help="Проверить настройки и базу данных и выйти")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(check())
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         print("\nБот остановлен пользователем")
     except Exception as e:
-        logging.error(f"Критическая ошибка: {e}")
\ No newline at end of file
+        logging.error(f"Критическая ошибка: {e}")
@@ -0,0 +1 @@
+# Этот файл делает директорию Python-пакетом
@@ -0,0 +1,19 @@
+import logging
+import time
+from aiogram import BaseMiddleware, types
+from bot import config
+from bot.services.diagnostics import profile_section
+
+
+class DiagnosticsMiddleware(BaseMiddleware):
+    """Профилирование обработчиков и учет медленных команд (только при DIAGNOSTICS=1)"""
+
+    async def __call__(self, handler, event: types.Message, data):
+        started = time.monotonic()
+        try:
+            with profile_section("handler"):
+                return await handler(event, data)
+        finally:
+            duration = time.monotonic() - started
+            if duration > config.DIAGNOSTICS_STALL_THRESHOLD:
+                logging.warning(f"Медленная обработка команды {event.text!r}: {duration:.3f} сек.")
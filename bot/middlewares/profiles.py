@@ -0,0 +1,16 @@
+import logging
+from aiogram import BaseMiddleware, types
+from bot.services.profiles import get_profile_cache
+
+
+class ProfileMiddleware(BaseMiddleware):
+    """Обновление имен пользователей в кеше профилей по входящим сообщениям"""
+
+    async def __call__(self, handler, event: types.Message, data):
+        if event.from_user is not None:
+            try:
+                get_profile_cache().observe(event.from_user)
+            except Exception as e:
+                logging.error(f"Ошибка при обновлении профиля пользователя {event.from_user.id}: {e}")
+
+        return await handler(event, data)
@@ -0,0 +1,149 @@
+import logging
+import time
+from collections import OrderedDict, deque
+from aiogram import BaseMiddleware, types
+from bot import config
+from bot.services.digest import MESSAGE_LIMIT
+
+# Команды, которые без аргументов только читают данные и могут отвечать из кеша
+READ_ONLY_COMMANDS = {"/lunch", "/delivery", "/stats"}
+
+
+class ReplyBuffer:
+    """Буфер ответов обработчика: все ответы на команду отправляются одним сообщением"""
+
+    def __init__(self, bot, chat_id):
+        self.bot = bot
+        self.chat_id = chat_id
+        self._parts = []
+
+    def add(self, text, parse_mode=None):
+        """Добавление ответа в буфер"""
+        self._parts.append((text, parse_mode))
+
+    def build_messages(self):
+        """Склейка подряд идущих ответов с одинаковым parse_mode в сообщения в пределах лимита"""
+        messages = []
+        for text, parse_mode in self._parts:
+            if messages and messages[-1][1] == parse_mode and len(messages[-1][0]) + len(text) + 2 <= MESSAGE_LIMIT:
+                messages[-1] = (f"{messages[-1][0]}\n\n{text}", parse_mode)
+            else:
+                messages.append((text, parse_mode))
+        return messages
+
+    async def flush(self):
+        """
+        Отправка накопленных ответов
+        Returns:
+            list: отправленные сообщения (text, parse_mode) для кеширования
+        """
+        messages = self.build_messages()
+        self._parts = []
+        await send_messages(self.bot, self.chat_id, messages)
+        return messages
+
+
+async def send_messages(bot, chat_id, messages):
+    """Отправка списка сообщений (text, parse_mode)"""
+    for text, parse_mode in messages:
+        await bot.send_message(chat_id, text, parse_mode=parse_mode)
+
+
+class _Window:
+    """Скользящее окно команд пользователя"""
+    __slots__ = ("hits", "warned")
+
+    def __init__(self):
+        self.hits = deque()
+        self.warned = False
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты команд для каждого пользователя
+    - скользящее окно: не более rate_limit команд за period секунд
+    - состояние хранится в LRU ограниченного размера
+    - повторные команды только для чтения получают кешированный ответ без обращения к БД
+    - несколько ответов обработчика склеиваются в одно сообщение
+    """
+
+    def __init__(self, rate_limit=None, period=None, max_users=None, cache_ttl=None):
+        self.rate_limit = rate_limit if rate_limit is not None else config.THROTTLE_RATE
+        self.period = period if period is not None else config.THROTTLE_PERIOD
+        self.max_users = max_users if max_users is not None else config.THROTTLE_MAX_USERS
+        self.cache_ttl = cache_ttl if cache_ttl is not None else config.REPLY_CACHE_TTL
+        self._windows = OrderedDict()  # user_id -> _Window
+        self._replies = OrderedDict()  # (user_id, command) -> (expires_at, messages)
+
+    async def __call__(self, handler, event: types.Message, data):
+        text = event.text or ""
+        if not text.startswith("/") or event.from_user is None:
+            return await handler(event, data)
+
+        user_id = event.from_user.id
+        now = time.monotonic()
+
+        window = self._hit(user_id, now)
+        if len(window.hits) > self.rate_limit:
+            # Предупреждаем один раз за окно, остальные команды молча отбрасываем
+            if not window.warned:
+                window.warned = True
+                await event.bot.send_message(user_id, "⏳ Слишком много команд, подождите немного.")
+            logging.info(f"Команда пользователя {user_id} отброшена ограничителем частоты: {text}")
+            return None
+
+        args = text.split()
+        command = args[0].split("@")[0].lower()
+        read_only = len(args) == 1 and command in READ_ONLY_COMMANDS
+        cache_key = (user_id, command)
+
+        if read_only:
+            cached = self._replies.get(cache_key)
+            if cached and cached[0] > now:
+                await send_messages(event.bot, user_id, cached[1])
+                return None
+        else:
+            # Любая изменяющая команда делает кешированные ответы пользователя неактуальными
+            self._invalidate(user_id)
+
+        replies = ReplyBuffer(event.bot, user_id)
+        data["replies"] = replies
+        succeeded = False
+        try:
+            result = await handler(event, data)
+            succeeded = True
+            return result
+        finally:
+            messages = await replies.flush()
+            if read_only and succeeded and messages:
+                self._replies[cache_key] = (now + self.cache_ttl, messages)
+                self._replies.move_to_end(cache_key)
+                while len(self._replies) > self.max_users:
+                    self._replies.popitem(last=False)
+
+    def _hit(self, user_id, now):
+        """Учет команды в скользящем окне пользователя"""
+        window = self._windows.get(user_id)
+        if window is None:
+            window = _Window()
+            self._windows[user_id] = window
+            while len(self._windows) > self.max_users:
+                self._windows.popitem(last=False)
+        else:
+            self._windows.move_to_end(user_id)
+
+        # Отбрасываем команды, вышедшие за пределы окна
+        while window.hits and window.hits[0] <= now - self.period:
+            window.hits.popleft()
+        if not window.hits:
+            window.warned = False
+
+        # Отброшенные команды не продлевают блокировку сверх лимита
+        if len(window.hits) <= self.rate_limit:
+            window.hits.append(now)
+        return window
+
+    def _invalidate(self, user_id):
+        """Удаление кешированных ответов пользователя"""
+        for command in READ_ONLY_COMMANDS:
+            self._replies.pop((user_id, command), None)
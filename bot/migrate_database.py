@@ -1,13 +1,13 @@
 import sqlite3
 import os
-from bot.config import DB_PATH
+from bot import config
 
 def migrate_database():
     """Миграция базы данных для добавления новых полей"""
     print("Начинаем миграцию базы данных...")
 
     # Подключаемся к базе данных
-    connection = sqlite3.connect(DB_PATH)
+    connection = sqlite3.connect(config.DB_PATH)
     cursor = connection.cursor()
 
     try:
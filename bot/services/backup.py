@@ -0,0 +1,244 @@
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+from bot import config
+from bot.database import connect_read_only
+
+SNAPSHOT_PREFIX = "lunch_bot-"
+SNAPSHOT_SUFFIX = ".db.gz"
+SNAPSHOT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+# Пауза между шагами копирования, чтобы обработчики и планировщик успевали писать в БД
+STEP_PAUSE = 0.05
+# Файлы журналов SQLite рядом с файлом БД
+JOURNAL_SUFFIXES = ("-journal", "-wal", "-shm")
+
+
+def _backup_sqlite(db_path, target_path, pages):
+    """
+    Копирование БД через online backup API SQLite небольшими порциями страниц
+    (исходная БД открывается только на чтение и должна существовать)
+    """
+    source = connect_read_only(db_path)
+    try:
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target, pages=pages, sleep=STEP_PAUSE)
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+
+def _copy_database_files(db_path, target_path):
+    """
+    Побайтовое копирование файла БД вместе с журналами (работает и для поврежденной БД)
+    Returns:
+        list: пути созданных копий
+    """
+    copied = []
+    try:
+        for suffix in ("",) + JOURNAL_SUFFIXES:
+            if os.path.exists(db_path + suffix):
+                shutil.copy2(db_path + suffix, target_path + suffix)
+                copied.append(target_path + suffix)
+        return copied
+    except OSError:
+        # Неполная копия бесполезна
+        for path in copied:
+            os.remove(path)
+        raise
+
+
+def check_database_file(path):
+    """
+    Полная проверка файла БД перед использованием
+    Returns:
+        list: пустой список, если файл в порядке, иначе описание проблем
+    """
+    connection = sqlite3.connect(path)
+    try:
+        rows = [row[0] for row in connection.execute('PRAGMA integrity_check').fetchall()]
+        if rows != ['ok']:
+            return rows
+
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if 'lunch_schedule' not in tables:
+            return ["нет таблицы lunch_schedule"]
+        return []
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    finally:
+        connection.close()
+
+
+def create_snapshot_sync(db_path, backup_dir, pages=None, now=None):
+    """
+    Создание сжатой копии БД (блокирующая версия, для потока или CLI)
+    Returns:
+        str: путь к созданной копии
+    """
+    if not os.path.isfile(db_path):
+        raise FileNotFoundError(f"файл базы данных {db_path} не найден")
+
+    pages = pages or config.BACKUP_PAGES
+    now = now or datetime.now()
+    os.makedirs(backup_dir, exist_ok=True)
+
+    name = f"{SNAPSHOT_PREFIX}{now.strftime(SNAPSHOT_TIME_FORMAT)}{SNAPSHOT_SUFFIX}"
+    snapshot_path = os.path.join(backup_dir, name)
+    raw_path = snapshot_path + ".raw"
+    tmp_path = snapshot_path + ".tmp"
+
+    try:
+        _backup_sqlite(db_path, raw_path, pages)
+
+        problems = check_database_file(raw_path)
+        if problems:
+            raise sqlite3.DatabaseError(f"копия не прошла проверку: {'; '.join(problems)}")
+
+        with open(raw_path, 'rb') as raw, gzip.open(tmp_path, 'wb') as compressed:
+            shutil.copyfileobj(raw, compressed)
+            compressed.flush()
+
+        # Копия появляется под своим именем только полностью записанной
+        os.replace(tmp_path, snapshot_path)
+        return snapshot_path
+    finally:
+        for path in (raw_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+async def create_snapshot(db_path=None, backup_dir=None):
+    """Создание копии БД в отдельном потоке, не блокируя event loop"""
+    return await asyncio.to_thread(
+        create_snapshot_sync,
+        db_path or config.DB_PATH,
+        backup_dir or config.BACKUP_DIR
+    )
+
+
+def list_snapshots(backup_dir):
+    """
+    Список копий в каталоге, от новых к старым
+    Returns:
+        list: пары (время создания, путь)
+    """
+    if not os.path.isdir(backup_dir):
+        return []
+
+    snapshots = []
+    for name in os.listdir(backup_dir):
+        if not (name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)):
+            continue
+        try:
+            created = datetime.strptime(name[len(SNAPSHOT_PREFIX):-len(SNAPSHOT_SUFFIX)], SNAPSHOT_TIME_FORMAT)
+        except ValueError:
+            continue
+        snapshots.append((created, os.path.join(backup_dir, name)))
+
+    return sorted(snapshots, reverse=True)
+
+
+def rotate_snapshots(backup_dir, keep=None, keep_days=None, now=None):
+    """
+    Удаление старых копий: остаются keep последних копий и по одной (самой поздней)
+    копии за каждый из последних keep_days дней
+    Returns:
+        list: пути удаленных копий
+    """
+    keep = config.BACKUP_KEEP if keep is None else keep
+    keep_days = config.BACKUP_KEEP_DAYS if keep_days is None else keep_days
+    now = now or datetime.now()
+    oldest_day = (now - timedelta(days=keep_days)).date()
+
+    removed = []
+    kept_days = set()
+    for index, (created, path) in enumerate(list_snapshots(backup_dir)):
+        day = created.date()
+        if index < keep:
+            kept_days.add(day)
+            continue
+        if day > oldest_day and day not in kept_days:
+            kept_days.add(day)
+            continue
+
+        os.remove(path)
+        removed.append(path)
+
+    return removed
+
+
+def restore_snapshot(snapshot_path, db_path):
+    """
+    Восстановление БД из копии: распаковка во временный файл, полная проверка
+    целостности и атомарная замена файла БД. Текущая БД (даже поврежденная)
+    сохраняется рядом как есть, вместе с журналами.
+    Бот на время восстановления должен быть остановлен.
+    Returns:
+        str: путь к сохраненной прежней БД или None, если ее не было
+    Raises:
+        sqlite3.DatabaseError: если копия повреждена
+    """
+    tmp_path = db_path + ".restore-tmp"
+    try:
+        with gzip.open(snapshot_path, 'rb') as compressed, open(tmp_path, 'wb') as raw:
+            shutil.copyfileobj(compressed, raw)
+
+        problems = check_database_file(tmp_path)
+        if problems:
+            raise sqlite3.DatabaseError(f"копия {snapshot_path} повреждена: {'; '.join(problems)}")
+
+        previous_path = None
+        if os.path.exists(db_path):
+            previous_path = f"{db_path}.before-restore-{datetime.now().strftime(SNAPSHOT_TIME_FORMAT)}"
+            _copy_database_files(db_path, previous_path)
+
+        # Журналы прежней БД не должны примениться к восстановленному файлу
+        for suffix in JOURNAL_SUFFIXES:
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+        os.replace(tmp_path, db_path)
+        return previous_path
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class SnapshotScheduler:
+    """Периодическое создание резервных копий БД с ротацией"""
+
+    def __init__(self, backup_dir=None, interval_hours=None):
+        self.backup_dir = backup_dir or config.BACKUP_DIR
+        self.interval_hours = interval_hours or config.BACKUP_INTERVAL_HOURS
+        self.is_running = False
+        self._stop_event = None
+
+    async def start(self):
+        """Запуск цикла резервного копирования"""
+        self.is_running = True
+        self._stop_event = asyncio.Event()
+
+        while self.is_running:
+            try:
+                snapshot_path = await create_snapshot(backup_dir=self.backup_dir)
+                removed = await asyncio.to_thread(rotate_snapshots, self.backup_dir)
+                logging.info(f"Создана резервная копия БД: {snapshot_path} (удалено старых: {len(removed)})")
+            except Exception as e:
+                logging.error(f"Ошибка при создании резервной копии БД: {e}")
+
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), self.interval_hours * 3600)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        """Остановка цикла резервного копирования"""
+        self.is_running = False
+        if self._stop_event is not None:
+            self._stop_event.set()
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """Реальное время"""
+
+    def now(self):
+        return datetime.now()
+
+    def today(self):
+        return self.now().date()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    async def wait(self, event, timeout):
+        """
+        Ожидание события не дольше timeout секунд
+        Returns:
+            bool: True если событие произошло
+        """
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class SimulatedClock:
+    """
+    Моделируемое время: ожидание мгновенно переводит часы вперед, поэтому недели работы
+    планировщика проигрываются за секунды. Действия, запланированные через call_at,
+    выполняются, когда часы доходят до указанного момента.
+    """
+
+    def __init__(self, start):
+        self._start = start
+        self._now = start
+        self._scheduled = []  # (время, порядковый номер, действие)
+
+    def now(self):
+        return self._now
+
+    def today(self):
+        return self._now.date()
+
+    def monotonic(self):
+        return (self._now - self._start).total_seconds()
+
+    def call_at(self, when, callback):
+        """Выполнить callback, когда моделируемое время дойдет до when"""
+        self._scheduled.append((when, len(self._scheduled), callback))
+        self._scheduled.sort(key=lambda item: item[:2])
+
+    def advance(self, seconds):
+        """Перевод часов вперед с выполнением наступивших действий по порядку"""
+        target = self._now + timedelta(seconds=seconds)
+        while self._scheduled and self._scheduled[0][0] <= target:
+            when, _, callback = self._scheduled.pop(0)
+            self._now = max(self._now, when)
+            callback()
+        self._now = target
+
+    async def sleep(self, seconds):
+        self.advance(seconds)
+        # Даем выполниться остальным задачам event loop
+        await asyncio.sleep(0)
+
+    async def wait(self, event, timeout):
+        if not event.is_set():
+            self.advance(timeout)
+            await asyncio.sleep(0)
+        return event.is_set()
+
+
+# Часы процесса (в режиме моделирования подменяются через set_clock)
+clock = SystemClock()
+
+
+def get_clock():
+    """Текущие часы процесса"""
+    return clock
+
+
+def set_clock(new_clock):
+    """Подмена часов процесса (моделирование, проверки)"""
+    global clock
+    clock = new_clock
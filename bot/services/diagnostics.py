@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from bot import config
+
+# Как часто event loop отмечается в сторожевом таймере (секунды)
+HEARTBEAT_INTERVAL = 0.05
+# Как часто профиль сбрасывается на диск (секунды)
+PROFILE_FLUSH_INTERVAL = 60
+# Максимальная глубина сохраняемого стека
+MAX_STACK_DEPTH = 64
+
+
+def _format_frame(frame):
+    """Кадр стека в виде 'файл:функция' для folded-формата flamegraph"""
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _folded_stack(frame):
+    """Стек от корня к текущей функции, разделенный ';'"""
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        frames.append(_format_frame(frame))
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class LoopWatchdog:
+    """
+    Сторожевой таймер event loop: корутина регулярно отмечается, а фоновый поток
+    при долгом отсутствии отметки сохраняет стек основного потока (кто блокирует loop)
+    """
+
+    def __init__(self, loop_thread_id, stall_threshold, report):
+        self.loop_thread_id = loop_thread_id
+        self.stall_threshold = stall_threshold
+        self.report = report
+        self._beat = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+        self._heartbeat_task = None
+
+    def start(self):
+        """Запуск (вызывается из event loop)"""
+        self._beat = time.monotonic()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановка"""
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    def _monitor(self):
+        reported_beat = None
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            beat = self._beat
+            stalled_for = time.monotonic() - beat
+            # Каждое зависание описываем один раз, пока loop не отметится снова
+            if stalled_for < self.stall_threshold or beat == reported_beat:
+                continue
+
+            reported_beat = beat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "стек недоступен\n"
+            self.report(f"Event loop заблокирован дольше {stalled_for:.3f} сек.:\n{stack}")
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик: фоновый поток снимает стек потока event loop,
+    но только пока выполняется профилируемый участок (тик планировщика или обработчик).
+    Пока участок ждет сети, loop простаивает в select или выполняет другие задачи,
+    поэтому сэмпл засчитывается участку, только если сейчас работает открывшая его задача
+    """
+
+    def __init__(self, loop, loop_thread_id, interval, output_dir):
+        self.loop = loop
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.output_dir = output_dir
+        self._active = {}  # задача -> Counter открытых в ней участков
+        self._samples = Counter()
+        self._day = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запуск потока сэмплирования"""
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановка и запись профиля"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self.flush()
+
+    @contextmanager
+    def section(self, name):
+        """Профилируемый участок кода"""
+        task = asyncio.current_task()
+        sections = self._active.setdefault(task, Counter())
+        sections[name] += 1
+        try:
+            yield
+        finally:
+            sections[name] -= 1
+            if not sections[name]:
+                del sections[name]
+            if not sections:
+                self._active.pop(task, None)
+
+    def flush(self):
+        """Запись накопленного за день профиля в folded-формате (flamegraph.pl, speedscope)"""
+        with self._lock:
+            day, samples = self._day, dict(self._samples)
+        self._write(day, samples)
+
+    def _write(self, day, samples):
+        if not samples:
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"profile-{day}.folded")
+        with open(path + ".tmp", "w", encoding="utf-8") as output:
+            output.writelines(f"{stack} {count}\n" for stack, count in samples.items())
+        os.replace(path + ".tmp", path)
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stop.wait(self.interval):
+            try:
+                if self._active:
+                    self._sample()
+
+                if time.monotonic() - last_flush >= PROFILE_FLUSH_INTERVAL:
+                    last_flush = time.monotonic()
+                    self.flush()
+            except Exception as e:
+                logging.error(f"Ошибка профилировщика: {e}")
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        task = asyncio.current_task(self.loop)
+        try:
+            # Корень стека - названия участков, открытых в выполняющейся сейчас задаче
+            sections = self._active.get(task) if task is not None else None
+            root = "+".join(sorted(tuple(sections))) if sections else ""
+        except RuntimeError:
+            # Набор участков изменился во время чтения - пропускаем этот сэмпл
+            return
+        if frame is None or not root:
+            return
+
+        stack = f"{root};{_folded_stack(frame)}"
+        day = datetime.now().strftime("%Y%m%d")
+
+        finished_day = None
+        with self._lock:
+            if day != self._day:
+                # Новый день - новый файл профиля
+                finished_day, finished_samples = self._day, dict(self._samples)
+                self._samples.clear()
+                self._day = day
+            self._samples[stack] += 1
+
+        if finished_day:
+            self._write(finished_day, finished_samples)
+
+
+class Diagnostics:
+    """Сторожевой таймер event loop и сэмплирующий профилировщик"""
+
+    def __init__(self):
+        self.output_dir = config.DIAGNOSTICS_DIR
+        self.lag_threshold = config.DIAGNOSTICS_LAG_THRESHOLD
+        self.max_tick_lag = 0.0
+        self.watchdog = None
+        self.profiler = None
+
+    def start(self):
+        """Запуск диагностики (вызывается из работающего event loop)"""
+        loop_thread_id = threading.get_ident()
+        self.watchdog = LoopWatchdog(loop_thread_id, config.DIAGNOSTICS_STALL_THRESHOLD, self._report_stall)
+        self.profiler = SamplingProfiler(
+            asyncio.get_running_loop(), loop_thread_id, config.DIAGNOSTICS_SAMPLE_INTERVAL, self.output_dir
+        )
+        self.watchdog.start()
+        self.profiler.start()
+        logging.info(f"Диагностика включена, отчеты сохраняются в {self.output_dir}")
+
+    def stop(self):
+        """Остановка диагностики с записью профиля"""
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.profiler:
+            self.profiler.stop()
+        logging.info(f"Диагностика остановлена, максимальное опоздание тика: {self.max_tick_lag:.3f} сек.")
+
+    def section(self, name):
+        """Профилируемый участок кода"""
+        return self.profiler.section(name) if self.profiler else nullcontext()
+
+    def report_tick_lag(self, lag):
+        """Учет опоздания пробуждения минутного цикла планировщика относительно целевого времени"""
+        self.max_tick_lag = max(self.max_tick_lag, lag)
+        if lag > self.lag_threshold:
+            logging.warning(f"Тик планировщика опоздал на {lag:.3f} сек.")
+
+    def _report_stall(self, text):
+        """Запись отчета о зависании (вызывается из потока сторожевого таймера)"""
+        logging.warning(text)
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(os.path.join(self.output_dir, "stalls.log"), "a", encoding="utf-8") as output:
+                output.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} {text}\n")
+        except OSError as e:
+            logging.error(f"Ошибка при записи отчета о зависании: {e}")
+
+
+# Общий экземпляр диагностики (None, если диагностика выключена)
+diagnostics = None
+
+
+def get_diagnostics():
+    """Получение диагностики, если она включена настройкой DIAGNOSTICS"""
+    global diagnostics
+    if diagnostics is None and config.DIAGNOSTICS:
+        diagnostics = Diagnostics()
+    return diagnostics
+
+
+def profile_section(name):
+    """Профилируемый участок кода (ничего не делает при выключенной диагностике)"""
+    current = get_diagnostics()
+    return current.section(name) if current else nullcontext()
+
+
+def report_tick_lag(lag):
+    """Учет опоздания тика планировщика (ничего не делает при выключенной диагностике)"""
+    current = get_diagnostics()
+    if current:
+        current.report_tick_lag(lag)
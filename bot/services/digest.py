@@ -0,0 +1,71 @@
+import html
+from bot import config
+
+# Способы доставки напоминаний
+DELIVERY_PRIVATE = "private"  # личное сообщение каждому пользователю
+DELIVERY_DIGEST = "digest"  # одно сообщение на слот в тему группы
+DELIVERY_BOTH = "both"  # и то, и другое
+DELIVERY_MODES = (DELIVERY_PRIVATE, DELIVERY_DIGEST, DELIVERY_BOTH)
+
+# Ограничение Telegram на длину текста сообщения
+MESSAGE_LIMIT = 4096
+# Максимум упоминаний в одном сообщении дайджеста
+MAX_MENTIONS = 50
+
+
+def resolve_delivery_mode(delivery_mode, group_configured=True):
+    """
+    Определяет фактический способ доставки для пользователя
+    Args:
+        delivery_mode: способ из настроек пользователя (None - по умолчанию)
+        group_configured: заданы ли GROUP_CHAT_ID и TOPIC_ID
+    Returns:
+        str: один из DELIVERY_MODES
+    """
+    mode = delivery_mode if delivery_mode in DELIVERY_MODES else config.DEFAULT_DELIVERY_MODE
+    if mode not in DELIVERY_MODES:
+        mode = DELIVERY_PRIVATE
+
+    # Без группового чата дайджест отправить некуда
+    if not group_configured:
+        return DELIVERY_PRIVATE
+
+    return mode
+
+
+def format_mention(user_id, display_name):
+    """HTML-упоминание пользователя по ID"""
+    return f'<a href="tg://user?id={user_id}">{html.escape(display_name)}</a>'
+
+
+def build_digest_messages(header, users, footer="", limit=MESSAGE_LIMIT, max_mentions=MAX_MENTIONS):
+    """
+    Разбивает упоминания пользователей на сообщения, укладывающиеся в ограничения Telegram
+    Args:
+        header: заголовок каждого сообщения (HTML)
+        users: список пар (user_id, display_name)
+        footer: подпись в конце каждого сообщения (HTML)
+    Returns:
+        list: пары (текст сообщения, список user_id упомянутых в нем пользователей)
+    """
+    messages = []
+    mentions = []
+    user_ids = []
+    length = len(header) + len(footer)
+
+    for user_id, display_name in users:
+        mention = format_mention(user_id, display_name)
+        # +2 на разделитель ", "
+        if mentions and (length + len(mention) + 2 > limit or len(mentions) >= max_mentions):
+            messages.append((header + ", ".join(mentions) + footer, user_ids))
+            mentions, user_ids = [], []
+            length = len(header) + len(footer)
+
+        mentions.append(mention)
+        user_ids.append(user_id)
+        length += len(mention) + 2
+
+    if mentions:
+        messages.append((header + ", ".join(mentions) + footer, user_ids))
+
+    return messages
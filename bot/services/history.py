@@ -0,0 +1,57 @@
+import logging
+from bot import config
+from bot.database import get_database
+from bot.services.clock import get_clock
+
+# Типы событий журнала
+EVENT_REMINDER_SENT = "reminder_sent"
+EVENT_PRE_REMINDER_SENT = "pre_reminder_sent"
+EVENT_REMINDER_FAILED = "reminder_failed"
+EVENT_LUNCH_SET = "lunch_set"
+EVENT_LUNCH_REMOVED = "lunch_removed"
+EVENT_NOTIFICATIONS_ON = "notifications_on"
+EVENT_NOTIFICATIONS_OFF = "notifications_off"
+EVENT_SCHEDULE_PUBLISHED = "schedule_published"
+EVENT_SCHEDULE_UPDATED = "schedule_updated"
+EVENT_DIGEST_SENT = "digest_sent"
+EVENT_DELIVERY_CHANGED = "delivery_changed"
+
+
+class HistoryLog:
+    """Буфер журнала событий: события копятся в памяти и записываются в БД пакетами"""
+
+    def __init__(self, db, batch_size=None):
+        self.db = db
+        self.batch_size = batch_size or config.HISTORY_BATCH_SIZE
+        self._buffer = []
+
+    def record(self, event_type, user_id=None, lunch_time=None, details=None):
+        """Добавление события в буфер (запись в БД при заполнении пакета)"""
+        ts = get_clock().now().strftime("%Y-%m-%d %H:%M:%S")
+        self._buffer.append((ts, event_type, user_id, lunch_time, details))
+
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Запись накопленных событий в БД одной транзакцией"""
+        if not self._buffer:
+            return
+
+        events, self._buffer = self._buffer, []
+        if not self.db.record_events(events):
+            # Возвращаем события в буфер (с ограничением размера), чтобы повторить запись позже
+            self._buffer = (events + self._buffer)[-self.batch_size * 10:]
+            logging.warning(f"Журнал событий не записан, в буфере {len(self._buffer)} событий")
+
+
+# Общий журнал событий для обработчиков и планировщика
+history_log = None
+
+
+def get_history_log():
+    """Получение общего журнала событий (создается при первом обращении)"""
+    global history_log
+    if history_log is None:
+        history_log = HistoryLog(get_database())
+    return history_log
@@ -1,10 +1,22 @@
-import holidays
-from datetime import datetime, date
+from datetime import datetime, timedelta
+from bot.services.clock import get_clock
 
 class WorkdayChecker:
-    def __init__(self):
-        # Российские праздники
-        self.ru_holidays = holidays.Russia()
+    def __init__(self, clock=None):
+        # Часы для определения "сегодня" (по умолчанию часы процесса)
+        self._clock = clock
+        self._ru_holidays = None
+
+    def _today(self):
+        return (self._clock or get_clock()).today()
+
+    @property
+    def ru_holidays(self):
+        """Российские праздники (библиотека holidays загружается при первой проверке)"""
+        if self._ru_holidays is None:
+            import holidays
+            self._ru_holidays = holidays.Russia()
+        return self._ru_holidays
 
     def is_workday(self, check_date=None):
         """
@@ -15,7 +27,7 @@ class WorkdayChecker:
             bool: True если рабочий день, False если выходной/праздник
         """
         if check_date is None:
-            check_date = date.today()
+            check_date = self._today()
         elif isinstance(check_date, datetime):
             check_date = check_date.date()
 
@@ -34,7 +46,7 @@ class WorkdayChecker:
         Возвращает название праздника, если день праздничный
         """
         if check_date is None:
-            check_date = date.today()
+            check_date = self._today()
         elif isinstance(check_date, datetime):
             check_date = check_date.date()
 
@@ -45,7 +57,7 @@ class WorkdayChecker:
         Возвращает следующий рабочий день
         """
         if start_date is None:
-            start_date = date.today()
+            start_date = self._today()
         elif isinstance(start_date, datetime):
             start_date = start_date.date()
 
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from bot import config
+from bot.database import get_database
+
+
+class UserProfile:
+    """Компактная копия строки lunch_schedule"""
+    __slots__ = ("user_id", "username", "first_name", "last_name", "lunch_time",
+                 "notifications_enabled", "delivery_mode")
+
+    def __init__(self, user_id, username, first_name, last_name, lunch_time,
+                 notifications_enabled=1, delivery_mode=None):
+        self.user_id = user_id
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+        self.lunch_time = lunch_time
+        self.notifications_enabled = bool(notifications_enabled)
+        self.delivery_mode = delivery_mode
+
+    def diff(self, **fields):
+        """Возвращает только те поля, значения которых отличаются от сохраненных"""
+        return {name: value for name, value in fields.items() if getattr(self, name) != value}
+
+
+class ProfileCache:
+    """
+    Кеш профилей пользователей (LRU ограниченного размера) поверх таблицы lunch_schedule.
+    Все изменения профилей в процессе должны идти через кеш: он пишет в БД только
+    действительно изменившиеся колонки.
+    """
+
+    # Отметка о том, что пользователя нет в расписании (чтобы не повторять SELECT)
+    _MISSING = object()
+
+    def __init__(self, db, max_size=None):
+        self.db = db
+        self.max_size = max_size or config.PROFILE_CACHE_SIZE
+        self._profiles = OrderedDict()
+
+    def get(self, user_id):
+        """Профиль пользователя или None, если он не зарегистрирован"""
+        profile = self._profiles.get(user_id)
+        if profile is None:
+            row = self.db.get_user_profile(user_id)
+            profile = UserProfile(*row) if row else self._MISSING
+            self._store(user_id, profile)
+        else:
+            self._profiles.move_to_end(user_id)
+
+        return None if profile is self._MISSING else profile
+
+    def observe(self, user):
+        """
+        Обновление имени пользователя по данным входящего сообщения
+        Args:
+            user: объект пользователя Telegram (from_user)
+        """
+        profile = self.get(user.id)
+        if profile is None:
+            return
+
+        changes = profile.diff(
+            username=user.username,
+            first_name=user.first_name or "",
+            last_name=user.last_name or ""
+        )
+        self._write(profile, changes)
+
+    def set_lunch_time(self, user_id, username, first_name, last_name, lunch_time):
+        """Установка времени обеда с записью только изменившихся колонок"""
+        profile = self.get(user_id)
+        if profile is None:
+            if not self.db.set_lunch_time(user_id, username, first_name, last_name, lunch_time):
+                return False
+            self._store(user_id, UserProfile(user_id, username, first_name, last_name, lunch_time))
+            return True
+
+        changes = profile.diff(
+            username=username,
+            first_name=first_name,
+            last_name=last_name,
+            lunch_time=lunch_time
+        )
+        return self._write(profile, changes)
+
+    def toggle_notifications(self, user_id):
+        """
+        Переключение уведомлений
+        Returns:
+            bool: новый статус или None, если пользователь не найден или запись не удалась
+        """
+        profile = self.get(user_id)
+        if profile is None:
+            return None
+
+        new_status = not profile.notifications_enabled
+        if not self._write(profile, {"notifications_enabled": new_status}):
+            return None
+        return new_status
+
+    def set_delivery_mode(self, user_id, delivery_mode):
+        """Установка способа доставки напоминаний"""
+        profile = self.get(user_id)
+        if profile is None:
+            return False
+        return self._write(profile, profile.diff(delivery_mode=delivery_mode))
+
+    def remove(self, user_id):
+        """Удаление пользователя из расписания"""
+        if not self.db.remove_user_from_schedule(user_id):
+            return False
+        self._store(user_id, self._MISSING)
+        return True
+
+    def _write(self, profile, changes):
+        """Запись изменившихся колонок в БД и обновление кеша"""
+        if not changes:
+            return True
+
+        values = {name: int(value) if isinstance(value, bool) else value for name, value in changes.items()}
+        if not self.db.update_user_fields(profile.user_id, values):
+            # Кеш мог устареть: перечитаем профиль при следующем обращении
+            self._profiles.pop(profile.user_id, None)
+            return False
+
+        for name, value in changes.items():
+            setattr(profile, name, value)
+        return True
+
+    def _store(self, user_id, profile):
+        """Сохранение профиля с вытеснением самых старых записей"""
+        self._profiles[user_id] = profile
+        self._profiles.move_to_end(user_id)
+        while len(self._profiles) > self.max_size:
+            self._profiles.popitem(last=False)
+
+
+# Общий кеш профилей процесса
+profile_cache = None
+
+
+def get_profile_cache():
+    """Получение общего кеша профилей (создается при первом обращении)"""
+    global profile_cache
+    if profile_cache is None:
+        profile_cache = ProfileCache(get_database())
+    return profile_cache
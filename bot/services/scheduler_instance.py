@@ -1,103 +1,170 @@
 import asyncio
 import logging
-from aiogram import Bot
-from bot.database import Database
-from bot.config import DB_PATH, GROUP_CHAT_ID, TOPIC_ID
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.jobstores.base import JobLookupError
-from datetime import datetime, timedelta, date
+from typing import TYPE_CHECKING
+from bot import config
+from bot.database import get_database
+from datetime import timedelta
+from bot.services.clock import get_clock
 from bot.services.holidays import WorkdayChecker
+from bot.services.history import (
+    get_history_log, EVENT_REMINDER_SENT, EVENT_PRE_REMINDER_SENT, EVENT_REMINDER_FAILED,
+    EVENT_SCHEDULE_PUBLISHED, EVENT_SCHEDULE_UPDATED, EVENT_DIGEST_SENT
+)
+from bot.services.diagnostics import profile_section, report_tick_lag
+from bot.services.digest import (
+    resolve_delivery_mode, build_digest_messages, DELIVERY_PRIVATE, DELIVERY_DIGEST, DELIVERY_BOTH
+)
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+# Час ежедневной публикации расписания
+DAILY_SCHEDULE_HOUR = 8
 
 workday_checker = WorkdayChecker()
 
-async def send_lunch_reminder(chat_id: int, message_text: str, bot):
+def _is_reminder_day(recipient, checker=None):
+    """Проверяет, рабочий ли сегодня день, и пишет в лог причину пропуска напоминания"""
+    checker = checker or workday_checker
+    if checker.is_workday():
+        return True
+
+    holiday_name = checker.get_holiday_name()
+    if holiday_name:
+        logging.info(f"Сегодня праздник ({holiday_name}), уведомление {recipient} не отправлено")
+    else:
+        logging.info(f"Сегодня выходной день, уведомление {recipient} не отправлено")
+    return False
+
+async def send_lunch_reminder(chat_id: int, message_text: str, bot, checker=None):
+    """
+    Отправка напоминания пользователю
+    Returns:
+        True если отправлено, False при ошибке, None если день нерабочий
+    """
     try:
         # Проверяем, рабочий ли сегодня день
-        if not workday_checker.is_workday():
-            holiday_name = workday_checker.get_holiday_name()
-            if holiday_name:
-                logging.info(f"Сегодня праздник ({holiday_name}), уведомление пользователю {chat_id} не отправлено")
-            else:
-                logging.info(f"Сегодня выходной день, уведомление пользователю {chat_id} не отправлено")
-            return
+        if not _is_reminder_day(f"пользователю {chat_id}", checker):
+            return None
 
         await bot.send_message(chat_id, message_text)
         logging.info(f"Отправлено уведомление пользователю (ID: {chat_id}): {message_text}")
+        return True
     except Exception as e:
         logging.error(f"Ошибка при отправке уведомления пользователю {chat_id}: {e}")
+        return False
+
+async def send_group_digest(message_text: str, bot, checker=None):
+    """
+    Отправка дайджеста напоминаний в тему группового чата
+    Returns:
+        True если отправлено, False при ошибке, None если день нерабочий
+    """
+    try:
+        if not _is_reminder_day("в групповой чат", checker):
+            return None
+
+        await bot.send_message(
+            chat_id=config.GROUP_CHAT_ID,
+            message_thread_id=config.TOPIC_ID,
+            text=message_text,
+            parse_mode='HTML'
+        )
+        logging.info(f"Отправлен дайджест напоминаний в групповой чат ({len(message_text)} символов)")
+        return True
+    except Exception as e:
+        logging.error(f"Ошибка при отправке дайджеста в групповой чат: {e}")
+        return False
 
 class LunchScheduler:
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: "Bot", clock=None):
         self.bot = bot
-        self.db = Database(DB_PATH)
-        self.workday_checker = WorkdayChecker()
+        # Часы планировщика: реальные или моделируемые (bot.simulate)
+        self.clock = clock or get_clock()
+        self.workday_checker = WorkdayChecker(clock) if clock else workday_checker
         self.is_running = False
-        self.current_schedule_hash = None
+        # Последний отрисованный текст расписания (без времени обновления)
+        self.rendered_text = None
+        self._stop_event = None
+        self._stopped = None
+
+    @property
+    def db(self):
+        """Общее подключение к БД (открывается при первом обращении)"""
+        return get_database()
 
     async def start(self):
         """Запуск планировщика"""
         self.is_running = True
+        self._stop_event = asyncio.Event()
+        self._stopped = asyncio.Event()
 
-        # Отправляем расписание при запуске, если его еще нет
-        await self._check_and_send_daily_schedule()
+        try:
+            # Подхватываем закрепленное сообщение или отправляем расписание, если его еще нет
+            await self._check_and_send_daily_schedule()
+
+            # Запускаем основной цикл планировщика
+            await self._scheduler_loop()
+        finally:
+            self._stopped.set()
+
+    async def stop(self, timeout=None):
+        """
+        Остановка планировщика. Закрепленное сообщение остается на месте, а уже начатая
+        рассылка текущей минуты дожидается завершения, но не дольше timeout секунд
+        Returns:
+            bool: True если планировщик остановился до истечения timeout
+        """
+        self.is_running = False
+        if self._stop_event is not None:
+            self._stop_event.set()
 
-        # Запускаем основной цикл планировщика
-        await self._scheduler_loop()
+        drained = True
+        if self._stopped is not None and not self._stopped.is_set():
+            timeout = config.SHUTDOWN_TIMEOUT if timeout is None else timeout
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout)
+            except asyncio.TimeoutError:
+                drained = False
+                logging.warning(f"Рассылка не завершилась за {timeout} сек., оставшиеся отправки прерываются")
 
-    async def stop(self):
-        """Остановка планировщика"""
-        self.is_running = False
+        # Дописываем накопленные события журнала
+        get_history_log().flush()
+        return drained
 
-    async def cleanup_on_shutdown(self):
-        """Очистка при остановке бота"""
-        try:
-            await self._unpin_and_delete_old_message()
-            logging.info("Выполнена очистка при остановке бота")
-        except Exception as e:
-            logging.error(f"Ошибка при очистке при остановке бота: {e}")
+    async def _sleep(self, seconds):
+        """Ожидание, которое прерывается при остановке планировщика"""
+        await self.clock.wait(self._stop_event, seconds)
 
     async def _scheduler_loop(self):
         """Основной цикл планировщика с точной синхронизацией"""
+        # Последняя обработанная минута
+        previous_minute = None
+
         while self.is_running:
             try:
-                # Получаем текущее время
-                current_datetime = datetime.now()
-
-                # Округляем до ближайшей минуты для точности
-                current_datetime = current_datetime.replace(second=0, microsecond=0)
-                current_time = current_datetime.strftime("%H:%M")
-
-                # Время через 5 минут
-                time_in_5_min = (current_datetime + timedelta(minutes=5)).strftime("%H:%M")
-
-                # Проверяем, нужно ли обновить ежедневное расписание в 8:00
-                if current_datetime.hour == 8 and current_datetime.minute == 0:
-                    if self.workday_checker.is_workday():
-                        await self._update_daily_schedule()
-
-                # Проверяем изменения в расписании каждую минуту
-                await self._check_schedule_changes()
-
-                # 1. ОСНОВНЫЕ НАПОМИНАНИЯ (время обеда СЕЙЧАС)
-                users_now = self.db.get_users_by_lunch_time_with_notifications(current_time)
-                if users_now:
-                    for user in users_now:
-                        user_id, username, first_name, last_name = user
-                        display_name = first_name or username or f"ID{user_id}"
-                        message_text = f"🍽️ Время обеда! ({current_time})\n\nПриятного аппетита, {display_name}! 😊\nНе забудь выйти из КЦ!"
-                        await send_lunch_reminder(user_id, message_text, self.bot)
-
-                # 2. ПРЕДВАРИТЕЛЬНЫЕ НАПОМИНАНИЯ (обед через 5 минут)
-                users_in_5_min = self.db.get_users_by_lunch_time_with_notifications(time_in_5_min)
-                if users_in_5_min:
-                    for user in users_in_5_min:
-                        user_id, username, first_name, last_name = user
-                        display_name = first_name or username or f"ID{user_id}"
-                        message_text = f"⏰ До обеда осталось 5 минут!\n\nВремя обеда: {time_in_5_min} 🍽️"
-                        await send_lunch_reminder(user_id, message_text, self.bot)
+                now = self.clock.now()
+                current_minute = now.replace(second=0, microsecond=0)
+
+                if previous_minute is not None:
+                    # Опоздание относительно минуты, которая должна обрабатываться сейчас
+                    # (учитывает и затянувшийся прошлый тик, и позднее пробуждение)
+                    expected_minute = previous_minute + timedelta(minutes=1)
+                    report_tick_lag((now - expected_minute).total_seconds())
+
+                    if current_minute > expected_minute:
+                        skipped = int((current_minute - expected_minute).total_seconds() // 60)
+                        logging.warning(
+                            f"Планировщик пропустил минут: {skipped} "
+                            f"(с {expected_minute:%H:%M} по {current_minute - timedelta(minutes=1):%H:%M})"
+                        )
+                previous_minute = current_minute
+
+                with profile_section("scheduler_tick"):
+                    await self._tick()
 
                 # 🎯 ТОЧНАЯ СИНХРОНИЗАЦИЯ: спим до начала следующей минуты
-                now = datetime.now()
+                now = self.clock.now()
                 next_minute = (now.replace(second=0, microsecond=0) + timedelta(minutes=1))
                 sleep_seconds = (next_minute - now).total_seconds()
 
@@ -105,25 +172,141 @@ class LunchScheduler:
                 if sleep_seconds < 1:
                     sleep_seconds = 1
 
-                await asyncio.sleep(sleep_seconds)
+                await self._sleep(sleep_seconds)
 
             except Exception as e:
                 logging.error(f"Ошибка в цикле планировщика: {e}")
                 # При ошибке спим 60 секунд и пытаемся снова
-                await asyncio.sleep(60)
+                await self._sleep(60)
+
+    async def _tick(self):
+        """Одна минута работы планировщика: расписание и напоминания"""
+        # Получаем текущее время
+        current_datetime = self.clock.now()
+
+        # Округляем до ближайшей минуты для точности
+        current_datetime = current_datetime.replace(second=0, microsecond=0)
+        current_time = current_datetime.strftime("%H:%M")
+
+        # Время через 5 минут
+        time_in_5_min = (current_datetime + timedelta(minutes=5)).strftime("%H:%M")
+
+        # Проверяем, нужно ли обновить ежедневное расписание в 8:00
+        if current_datetime.hour == DAILY_SCHEDULE_HOUR and current_datetime.minute == 0:
+            if self.workday_checker.is_workday():
+                await self._update_daily_schedule()
+
+        # Проверяем изменения в расписании каждую минуту
+        await self._check_schedule_changes()
+
+        # 1. ОСНОВНЫЕ НАПОМИНАНИЯ (время обеда СЕЙЧАС)
+        users_now = self.db.get_users_by_lunch_time_with_notifications(current_time)
+        if users_now:
+            await self._deliver_reminders(
+                users_now, current_time, EVENT_REMINDER_SENT,
+                private_text=lambda display_name: (
+                    f"🍽️ Время обеда! ({current_time})\n\nПриятного аппетита, {display_name}! 😊\nНе забудь выйти из КЦ!"
+                ),
+                digest_header=f"🍽️ <b>Время обеда! ({current_time})</b>\n\nПриятного аппетита: ",
+                digest_footer=" 😊\nНе забудьте выйти из КЦ!"
+            )
+
+        # 2. ПРЕДВАРИТЕЛЬНЫЕ НАПОМИНАНИЯ (обед через 5 минут)
+        users_in_5_min = self.db.get_users_by_lunch_time_with_notifications(time_in_5_min)
+        if users_in_5_min:
+            await self._deliver_reminders(
+                users_in_5_min, time_in_5_min, EVENT_PRE_REMINDER_SENT,
+                private_text=lambda display_name: (
+                    f"⏰ До обеда осталось 5 минут!\n\nВремя обеда: {time_in_5_min} 🍽️"
+                ),
+                digest_header=f"⏰ <b>До обеда осталось 5 минут!</b> ({time_in_5_min} 🍽️)\n\n"
+            )
+
+        # Записываем события за минуту одним пакетом
+        get_history_log().flush()
+
+    async def _deliver_reminders(self, users, lunch_time, event_type, private_text, digest_header, digest_footer=""):
+        """
+        Рассылка напоминаний одного слота с учетом способа доставки каждого пользователя
+        Args:
+            users: строки (user_id, username, first_name, last_name, delivery_mode)
+            lunch_time: время слота (ЧЧ:ММ)
+            event_type: тип события журнала для успешной отправки
+            private_text: функция, возвращающая текст личного сообщения по имени пользователя
+            digest_header: начало сообщения дайджеста (HTML)
+            digest_footer: окончание сообщения дайджеста (HTML)
+        """
+        group_configured = bool(config.GROUP_CHAT_ID and config.TOPIC_ID)
+        digest_users = []
+        digest_only = set()
+
+        for user_id, username, first_name, last_name, delivery_mode in users:
+            mode = resolve_delivery_mode(delivery_mode, group_configured)
+
+            if mode in (DELIVERY_PRIVATE, DELIVERY_BOTH):
+                display_name = first_name or username or f"ID{user_id}"
+                sent = await send_lunch_reminder(user_id, private_text(display_name), self.bot, self.workday_checker)
+                self._record_reminder(sent, event_type, user_id, lunch_time)
+
+            if mode in (DELIVERY_DIGEST, DELIVERY_BOTH):
+                digest_users.append((user_id, self._format_display_name(username, first_name, last_name)))
+                if mode == DELIVERY_DIGEST:
+                    digest_only.add(user_id)
+
+        # Один дайджест на слот (разбитый на части по ограничениям Telegram)
+        for message_text, user_ids in build_digest_messages(digest_header, digest_users, digest_footer):
+            sent = await send_group_digest(message_text, self.bot, self.workday_checker)
+            if sent:
+                get_history_log().record(EVENT_DIGEST_SENT, lunch_time=lunch_time, details=str(len(user_ids)))
+
+            # Пользователи с "both" уже учтены при личной отправке
+            for user_id in user_ids:
+                if user_id in digest_only:
+                    self._record_reminder(sent, event_type, user_id, lunch_time, channel=DELIVERY_DIGEST)
+
+    @staticmethod
+    def _record_reminder(sent, event_type, user_id, lunch_time, channel=DELIVERY_PRIVATE):
+        """Запись результата отправки напоминания в журнал событий"""
+        if sent is None:
+            return
+        get_history_log().record(
+            event_type if sent else EVENT_REMINDER_FAILED,
+            user_id=user_id,
+            lunch_time=lunch_time,
+            details=channel if sent else f"{event_type}:{channel}"
+        )
 
     async def _check_and_send_daily_schedule(self):
         """Проверка и отправка ежедневного расписания при необходимости"""
-        today = date.today().strftime("%Y-%m-%d")
-        pinned_info = self.db.get_pinned_message()
+        today = self.clock.today().strftime("%Y-%m-%d")
+        pinned_state = self.db.get_pinned_state()
+
+        if pinned_state:
+            # Запоминаем отрисованный текст закрепленного сообщения, чтобы не редактировать
+            # его без изменений расписания (в том числе сообщение прошлого дня в выходные)
+            message_id, pinned_date, self.rendered_text, version = pinned_state
+
+            # Сообщение прошлого дня до 8:00 заменит утреннее обновление, а в выходные оно остается
+            if (pinned_date == today or not self.workday_checker.is_workday()
+                    or self.clock.now().hour < DAILY_SCHEDULE_HOUR):
+                # Отредактируем сообщение, только если расписание изменилось, пока бот был остановлен
+                logging.info(f"Используем закрепленное расписание (ID: {message_id}, версия {version})")
+                await self._check_schedule_changes()
+                return
 
-        # Если сообщения нет или оно от другого дня, создаем новое
-        if not pinned_info or pinned_info[1] != today:
-            if self.workday_checker.is_workday():
-                await self._create_daily_schedule()
+        # Если сообщения нет или после 8:00 закреплено сообщение другого дня, создаем новое
+        if self.workday_checker.is_workday():
+            if pinned_state:
+                await self._unpin_and_delete_old_message()
+            await self._create_daily_schedule()
 
     async def _update_daily_schedule(self):
         """Обновление ежедневного расписания в 8:00"""
+        # Расписание за сегодня уже опубликовано (например, при запуске бота в 8:00)
+        pinned_state = self.db.get_pinned_state()
+        if pinned_state and pinned_state[1] == self.clock.today().strftime("%Y-%m-%d"):
+            return
+
         # Открепляем и удаляем старое сообщение
         await self._unpin_and_delete_old_message()
 
@@ -134,31 +317,33 @@ class LunchScheduler:
         """Создание нового ежедневного расписания"""
         try:
             # Проверяем, что настройки группового чата заданы
-            if not GROUP_CHAT_ID or not TOPIC_ID:
+            if not config.GROUP_CHAT_ID or not config.TOPIC_ID:
                 logging.warning("GROUP_CHAT_ID или TOPIC_ID не настроены, пропускаем отправку группового расписания")
                 return
 
-            schedule_text = self._generate_schedule_text()
-            today = date.today().strftime("%Y-%m-%d")
+            schedule_body = self._generate_schedule_body()
+            schedule_text = self._generate_schedule_text(schedule_body)
+            today = self.clock.today().strftime("%Y-%m-%d")
 
             # Отправляем сообщение в групповой чат
             message = await self.bot.send_message(
-                chat_id=GROUP_CHAT_ID,
-                message_thread_id=TOPIC_ID,
+                chat_id=config.GROUP_CHAT_ID,
+                message_thread_id=config.TOPIC_ID,
                 text=schedule_text,
                 parse_mode='HTML'
             )
 
             # Закрепляем сообщение
             await self.bot.pin_chat_message(
-                chat_id=GROUP_CHAT_ID,
+                chat_id=config.GROUP_CHAT_ID,
                 message_id=message.message_id,
                 disable_notification=True
             )
 
             # Сохраняем информацию о сообщении
-            self.db.set_pinned_message(message.message_id, today)
-            self.current_schedule_hash = self._get_schedule_hash()
+            self.db.set_pinned_message(message.message_id, today, schedule_body)
+            self.rendered_text = schedule_body
+            get_history_log().record(EVENT_SCHEDULE_PUBLISHED, details=str(message.message_id))
 
             logging.info(f"Создано и закреплено новое расписание обедов (ID: {message.message_id})")
 
@@ -168,21 +353,20 @@ class LunchScheduler:
     async def _check_schedule_changes(self):
         """Проверка изменений в расписании"""
         try:
-            current_hash = self._get_schedule_hash()
+            schedule_body = self._generate_schedule_body()
 
             # Если расписание изменилось, обновляем сообщение
-            if current_hash != self.current_schedule_hash:
-                await self._update_pinned_message()
-                self.current_schedule_hash = current_hash
+            if schedule_body != self.rendered_text:
+                await self._update_pinned_message(schedule_body)
 
         except Exception as e:
             logging.error(f"Ошибка при проверке изменений расписания: {e}")
 
-    async def _update_pinned_message(self):
+    async def _update_pinned_message(self, schedule_body):
         """Обновление закрепленного сообщения"""
         try:
             # Проверяем, что настройки группового чата заданы
-            if not GROUP_CHAT_ID or not TOPIC_ID:
+            if not config.GROUP_CHAT_ID or not config.TOPIC_ID:
                 return
 
             pinned_info = self.db.get_pinned_message()
@@ -190,16 +374,31 @@ class LunchScheduler:
                 return
 
             message_id, _ = pinned_info
-            schedule_text = self._generate_schedule_text()
+            schedule_text = self._generate_schedule_text(schedule_body)
 
             # Обновляем текст сообщения
-            await self.bot.edit_message_text(
-                chat_id=GROUP_CHAT_ID,
-                message_id=message_id,
-                text=schedule_text,
-                parse_mode='HTML'
-            )
-
+            try:
+                await self.bot.edit_message_text(
+                    chat_id=config.GROUP_CHAT_ID,
+                    message_id=message_id,
+                    text=schedule_text,
+                    parse_mode='HTML'
+                )
+            except Exception as e:
+                if "message to edit not found" in str(e):
+                    # Сообщение удалили вручную: публикуем расписание заново
+                    logging.warning(f"Закрепленное расписание не найдено (ID: {message_id}), создаем новое")
+                    self.db.clear_pinned_message()
+                    await self._create_daily_schedule()
+                    return
+                # Текст уже совпадает (например, сохранение в БД не прошло до перезапуска)
+                if "message is not modified" not in str(e):
+                    raise
+
+            # Запоминаем отрисованный текст, чтобы после перезапуска не редактировать сообщение повторно
+            self.db.set_pinned_text(schedule_body)
+            self.rendered_text = schedule_body
+            get_history_log().record(EVENT_SCHEDULE_UPDATED, details=str(message_id))
             logging.info("Расписание обедов обновлено")
 
         except Exception as e:
@@ -209,7 +408,7 @@ class LunchScheduler:
         """Открепление и удаление старого сообщения"""
         try:
             # Проверяем, что настройки группового чата заданы
-            if not GROUP_CHAT_ID:
+            if not config.GROUP_CHAT_ID:
                 return
 
             pinned_info = self.db.get_pinned_message()
@@ -220,13 +419,13 @@ class LunchScheduler:
 
             # Открепляем сообщение
             await self.bot.unpin_chat_message(
-                chat_id=GROUP_CHAT_ID,
+                chat_id=config.GROUP_CHAT_ID,
                 message_id=message_id
             )
 
             # Удаляем сообщение
             await self.bot.delete_message(
-                chat_id=GROUP_CHAT_ID,
+                chat_id=config.GROUP_CHAT_ID,
                 message_id=message_id
             )
 
@@ -251,8 +450,8 @@ class LunchScheduler:
         else:
             return "Пользователь"
 
-    def _generate_schedule_text(self):
-        """Генерация текста расписания"""
+    def _generate_schedule_body(self):
+        """Генерация текста расписания без времени обновления (по нему отслеживаются изменения)"""
         schedules = self.db.get_all_lunch_schedules()
 
         if not schedules:
@@ -265,38 +464,15 @@ class LunchScheduler:
             display_name = self._format_display_name(username, first_name, last_name)
             text += f"🕐 <b>{lunch_time}</b> - {display_name}\n"
 
-        text += f"\n<i>Последнее обновление: {datetime.now().strftime('%H:%M')}</i>"
-
         return text
 
-    def _get_schedule_hash(self):
-        """Получение хеша текущего расписания для отслеживания изменений"""
-        schedules = self.db.get_all_lunch_schedules()
-        return hash(str(schedules))
-
-# Глобальный планировщик для других задач
-scheduler = None
-
-
-def init_scheduler(bot):
-    """
-    Инициализация планировщика задач
-    """
-    global scheduler
-    scheduler = AsyncIOScheduler()
-
-    return scheduler
+    def _generate_schedule_text(self, schedule_body=None):
+        """Генерация текста расписания"""
+        if schedule_body is None:
+            schedule_body = self._generate_schedule_body()
 
+        # Время обновления показываем только для непустого расписания
+        if not schedule_body.endswith("\n"):
+            return schedule_body
 
-def stop_scheduler(scheduler_instance=None):
-    """
-    Остановка всех задач и самого планировщика
-    """
-    global scheduler
-    sch = scheduler_instance or scheduler
-    if sch:
-        try:
-            sch.shutdown(wait=False)
-        except JobLookupError as e:
-            print(f"Ошибка при остановке планировщика: {e}")
-            logging.error(f"Ошибка при остановке планировщика: {e}")
\ No newline at end of file
+        return schedule_body + f"\n<i>Последнее обновление: {self.clock.now().strftime('%H:%M')}</i>"
@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+from bot import config
+from bot.services.clock import SimulatedClock, set_clock
+from bot.services.digest import DELIVERY_MODES
+
+# Групповой чат и тема, в которые "отправляет" моделируемый бот
+SIMULATED_GROUP_CHAT_ID = "-100"
+SIMULATED_TOPIC_ID = "1"
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+class SimulatedMessage:
+    """Ответ Telegram на отправку сообщения (нужен только message_id)"""
+    __slots__ = ("message_id",)
+
+    def __init__(self, message_id):
+        self.message_id = message_id
+
+
+class RecordingBot:
+    """
+    Бот без обращения к Telegram: каждый вызов API записывается в трассу с моделируемым
+    временем, а редактирование ведет себя как в Telegram (ошибки для удаленного сообщения
+    и для текста без изменений)
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.calls = []  # (время, метод, chat_id, message_id, текст)
+        self._messages = {}  # (chat_id, message_id) -> текст
+        self._next_message_id = 1
+
+    def _record(self, method, chat_id, message_id=None, text=None):
+        self.calls.append((self.clock.now(), method, str(chat_id), message_id, text))
+
+    async def send_message(self, chat_id, text, message_thread_id=None, parse_mode=None):
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        self._messages[(str(chat_id), message_id)] = text
+        self._record("send_message", chat_id, message_id, text)
+        return SimulatedMessage(message_id)
+
+    async def edit_message_text(self, chat_id, message_id, text, parse_mode=None):
+        key = (str(chat_id), message_id)
+        if key not in self._messages:
+            raise RuntimeError("Bad Request: message to edit not found")
+        if self._messages[key] == text:
+            raise RuntimeError("Bad Request: message is not modified")
+        self._messages[key] = text
+        self._record("edit_message_text", chat_id, message_id, text)
+
+    async def pin_chat_message(self, chat_id, message_id, disable_notification=False):
+        self._record("pin_chat_message", chat_id, message_id)
+
+    async def unpin_chat_message(self, chat_id, message_id=None):
+        self._record("unpin_chat_message", chat_id, message_id)
+
+    async def delete_message(self, chat_id, message_id):
+        self._messages.pop((str(chat_id), message_id), None)
+        self._record("delete_message", chat_id, message_id)
+
+
+def generate_scenario(users_count, start, days, edits_per_day, seed):
+    """Случайный (но воспроизводимый по seed) сценарий: пользователи и их действия"""
+    rng = random.Random(seed)
+    slots = [f"{hour:02d}:{minute:02d}" for hour in range(11, 15) for minute in (0, 15, 30, 45)]
+
+    users = []
+    for index in range(users_count):
+        users.append({
+            "user_id": 1000 + index,
+            "first_name": f"Сотрудник{index + 1}",
+            "lunch_time": rng.choice(slots),
+            "delivery_mode": rng.choice(DELIVERY_MODES),
+        })
+
+    events = []
+    for day in range(days):
+        for _ in range(edits_per_day):
+            at = datetime.combine(start.date() + timedelta(days=day), datetime.min.time())
+            at += timedelta(minutes=rng.randrange(7 * 60, 16 * 60))
+            user = rng.choice(users)
+            action = rng.choice(("lunch_time", "lunch_time", "notifications", "delivery_mode", "remove"))
+            event = {"at": at.strftime(TIME_FORMAT), "user_id": user["user_id"]}
+            if action == "lunch_time":
+                event["lunch_time"] = rng.choice(slots)
+            elif action == "notifications":
+                event["notifications"] = rng.random() < 0.5
+            elif action == "delivery_mode":
+                event["delivery_mode"] = rng.choice(DELIVERY_MODES)
+            else:
+                event["remove"] = True
+            events.append(event)
+
+    return {"users": users, "events": sorted(events, key=lambda event: event["at"])}
+
+
+def apply_user_event(profiles, event):
+    """Действие пользователя из сценария через тот же кеш профилей, что и обработчики команд"""
+    user_id = event["user_id"]
+
+    if event.get("remove"):
+        profiles.remove(user_id)
+        return
+
+    if "lunch_time" in event:
+        profile = profiles.get(user_id)
+        first_name = event.get("first_name") or (profile.first_name if profile else f"ID{user_id}")
+        profiles.set_lunch_time(
+            user_id,
+            event.get("username") or (profile.username if profile else None),
+            first_name,
+            event.get("last_name") or (profile.last_name if profile else ""),
+            event["lunch_time"]
+        )
+
+    if "delivery_mode" in event:
+        profiles.set_delivery_mode(user_id, event["delivery_mode"])
+
+    if "notifications" in event:
+        profile = profiles.get(user_id)
+        if profile and profile.notifications_enabled != event["notifications"]:
+            profiles.toggle_notifications(user_id)
+
+
+async def run_simulation(scenario, start, days):
+    """
+    Проигрывание сценария в моделируемом времени
+    Returns:
+        tuple: (вызовы API, минуты тиков по запускам планировщика, простои)
+    """
+    from bot.services.profiles import get_profile_cache
+    from bot.services.scheduler_instance import LunchScheduler
+
+    class TracingScheduler(LunchScheduler):
+        """Планировщик, запоминающий минуты своих тиков"""
+
+        def __init__(self, bot, clock, ticks):
+            super().__init__(bot, clock)
+            self.ticks = ticks
+
+        async def _tick(self):
+            self.ticks.append(self.clock.now().replace(second=0, microsecond=0))
+            await super()._tick()
+
+    clock = SimulatedClock(start)
+    set_clock(clock)
+    bot = RecordingBot(clock)
+    profiles = get_profile_cache()
+    end = start + timedelta(days=days)
+
+    for user in scenario.get("users", []):
+        apply_user_event(profiles, user)
+
+    restarts = []
+    for event in scenario.get("events", []):
+        at = datetime.strptime(event["at"], TIME_FORMAT)
+        if not start <= at < end:
+            continue
+        if event.get("restart"):
+            restarts.append((at, event.get("down_minutes", 1)))
+        else:
+            clock.call_at(at, lambda event=event: apply_user_event(profiles, event))
+
+    runs = []
+    downtimes = []
+    for stop_at, down_minutes in sorted(restarts) + [(end, 0)]:
+        ticks = []
+        runs.append(ticks)
+        scheduler = TracingScheduler(bot, clock, ticks)
+        task = asyncio.create_task(scheduler.start())
+
+        reached = asyncio.Event()
+        clock.call_at(stop_at, reached.set)
+        await reached.wait()
+        await scheduler.stop()
+        await task
+
+        if down_minutes:
+            # Бот остановлен: действия пользователей за это время все равно попадают в БД
+            downtimes.append((clock.now(), down_minutes))
+            clock.advance(down_minutes * 60)
+
+    return bot.calls, runs, downtimes
+
+
+def find_problems(calls, runs):
+    """
+    Поиск повторных отправок и пропущенных минут
+    Returns:
+        list: описания проблем
+    """
+    problems = []
+
+    # Повторная обработка минуты ищется и между запусками (быстрый перезапуск)
+    for minute, count in Counter(minute for ticks in runs for minute in ticks).items():
+        if count > 1:
+            problems.append(f"{minute:%Y-%m-%d %H:%M} минута обработана {count} раза")
+
+    for ticks in runs:
+        for previous, current in zip(ticks, ticks[1:]):
+            if current - previous > timedelta(minutes=1):
+                problems.append(f"пропущены минуты с {previous + timedelta(minutes=1):%Y-%m-%d %H:%M} по "
+                                f"{current - timedelta(minutes=1):%Y-%m-%d %H:%M}")
+
+    sends = Counter(
+        (ts.replace(second=0, microsecond=0), chat_id, text)
+        for ts, method, chat_id, _, text in calls
+        if method == "send_message"
+    )
+    for (minute, chat_id, text), count in sorted(sends.items()):
+        if count > 1:
+            first_line = text.splitlines()[0] if text else ""
+            problems.append(f"{minute:%Y-%m-%d %H:%M} сообщение в чат {chat_id} отправлено {count} раза: {first_line}")
+
+    # Расписание публикуется не чаще раза в день, в том числе при перезапусках
+    published = Counter(
+        ts.date() for ts, method, chat_id, _, text in calls
+        if method == "send_message" and chat_id == str(config.GROUP_CHAT_ID) and text.startswith("📅")
+    )
+    for day, count in sorted(published.items()):
+        if count > 1:
+            problems.append(f"{day} расписание опубликовано {count} раза")
+
+    return problems
+
+
+def format_call(call):
+    """Строка трассы: время, метод, чат, сообщение и текст в одну строку"""
+    ts, method, chat_id, message_id, text = call
+    line = f"{ts:%Y-%m-%d %H:%M:%S} {method} chat={chat_id}"
+    if message_id is not None:
+        line += f" message={message_id}"
+    if text is not None:
+        line += " text=" + json.dumps(text, ensure_ascii=False)
+    return line
+
+
+def simulate(args):
+    """Моделирование работы планировщика за несколько дней"""
+    start = datetime.strptime(args.start, "%Y-%m-%d") if args.start else datetime.combine(
+        datetime.now().date(), datetime.min.time())
+
+    if args.scenario:
+        with open(args.scenario, encoding="utf-8") as source:
+            scenario = json.load(source)
+    else:
+        scenario = generate_scenario(args.users, start, args.days, args.edits, args.seed)
+
+    # Моделирование не трогает рабочую БД и не обращается к Telegram
+    workdir = tempfile.mkdtemp(prefix="lunch-simulation-")
+    config.DB_PATH = os.path.join(workdir, "lunch_bot.db")
+    config.GROUP_CHAT_ID = None if args.no_group else SIMULATED_GROUP_CHAT_ID
+    config.TOPIC_ID = None if args.no_group else SIMULATED_TOPIC_ID
+    config.DIAGNOSTICS = False
+
+    calls, runs, downtimes = asyncio.run(run_simulation(scenario, start, args.days))
+
+    output = open(args.trace, "w", encoding="utf-8") if args.trace else sys.stdout
+    try:
+        for call in calls:
+            print(format_call(call), file=output)
+    finally:
+        if args.trace:
+            output.close()
+
+    methods = Counter(method for _, method, _, _, _ in calls)
+    print(f"\n📊 Моделирование с {start:%Y-%m-%d} на {args.days} дн. (БД: {config.DB_PATH})")
+    print(f"  - минут обработано: {sum(len(ticks) for ticks in runs)}, запусков планировщика: {len(runs)}")
+    for stopped_at, down_minutes in downtimes:
+        print(f"  - остановка {stopped_at:%Y-%m-%d %H:%M} на {down_minutes} мин.")
+    for method, count in sorted(methods.items()):
+        print(f"  - {method}: {count}")
+
+    problems = find_problems(calls, runs)
+    if not problems:
+        print("✅ Повторных отправок и пропущенных минут нет")
+        return 0
+
+    print(f"❌ Найдено проблем: {len(problems)}")
+    for problem in problems:
+        print(f"  - {problem}")
+    return 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Моделирование работы планировщика обедов в ускоренном времени")
+    parser.add_argument("--start", help="Первый день моделирования ГГГГ-ММ-ДД (по умолчанию сегодня)")
+    parser.add_argument("--days", type=int, default=7, help="Сколько дней моделировать")
+    parser.add_argument("--scenario", help="JSON-сценарий: пользователи (users) и действия (events)")
+    parser.add_argument("--users", type=int, default=20, help="Пользователей в случайном сценарии")
+    parser.add_argument("--edits", type=int, default=5, help="Действий пользователей в день в случайном сценарии")
+    parser.add_argument("--seed", type=int, default=1, help="Начальное значение случайного сценария")
+    parser.add_argument("--trace", help="Файл для трассы вызовов API (по умолчанию вывод в консоль)")
+    parser.add_argument("--no-group", action="store_true", help="Моделировать без группового чата")
+    args = parser.parse_args()
+
+    # Подробный лог каждой отправки в моделировании не нужен
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(simulate(args))
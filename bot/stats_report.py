@@ -0,0 +1,72 @@
+import argparse
+import sqlite3
+from datetime import date
+from bot import config
+from bot.database import Database
+from bot.services.history import (
+    EVENT_REMINDER_SENT, EVENT_PRE_REMINDER_SENT, EVENT_REMINDER_FAILED, EVENT_LUNCH_SET,
+    EVENT_LUNCH_REMOVED, EVENT_NOTIFICATIONS_ON, EVENT_NOTIFICATIONS_OFF, EVENT_DIGEST_SENT,
+    EVENT_DELIVERY_CHANGED
+)
+
+EVENT_TITLES = {
+    EVENT_REMINDER_SENT: "Напоминаний об обеде",
+    EVENT_PRE_REMINDER_SENT: "Предварительных напоминаний",
+    EVENT_REMINDER_FAILED: "Ошибок отправки",
+    EVENT_LUNCH_SET: "Установок времени обеда",
+    EVENT_LUNCH_REMOVED: "Удалений из расписания",
+    EVENT_NOTIFICATIONS_ON: "Включений уведомлений",
+    EVENT_NOTIFICATIONS_OFF: "Выключений уведомлений",
+    EVENT_DIGEST_SENT: "Сообщений-дайджестов в группу",
+    EVENT_DELIVERY_CHANGED: "Изменений способа доставки",
+}
+
+
+def stats_report(month, top):
+    """
+    Отчет по сводным таблицам журнала событий за месяц (формат ГГГГ-ММ)
+    Returns:
+        int: код завершения (0 - отчет построен)
+    """
+    try:
+        db = Database.open_read_only(config.DB_PATH)
+    except (OSError, sqlite3.Error) as e:
+        print(f"❌ Не удалось открыть базу данных: {e}")
+        return 1
+
+    try:
+        totals = db.get_period_stats(f"{month}-01", f"{month}-31")
+        print(f"📊 Статистика обедов за {month}")
+
+        if not totals:
+            print("  Событий за этот месяц нет")
+            return 0
+
+        for event_type, count in sorted(totals.items()):
+            print(f"  - {EVENT_TITLES.get(event_type, event_type)}: {count}")
+
+        busiest = db.get_top_slots(month, EVENT_REMINDER_SENT, limit=top)
+        if busiest:
+            print("\n🔥 Самые загруженные минуты (по напоминаниям):")
+            for lunch_time, count in busiest:
+                print(f"  - {lunch_time}: {count}")
+
+        popular = db.get_top_slots(month, EVENT_LUNCH_SET, limit=top)
+        if popular:
+            print("\n⭐ Чаще всего выбирают:")
+            for lunch_time, count in popular:
+                print(f"  - {lunch_time}: {count}")
+        return 0
+    except sqlite3.Error as e:
+        print(f"❌ Ошибка чтения базы данных {config.DB_PATH}: {e}")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отчет по статистике обедов")
+    parser.add_argument("--month", default=date.today().strftime("%Y-%m"), help="Месяц в формате ГГГГ-ММ")
+    parser.add_argument("--top", type=int, default=5, help="Количество строк в рейтингах")
+    args = parser.parse_args()
+    raise SystemExit(stats_report(args.month, args.top))
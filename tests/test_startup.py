@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Бюджет на импорт модулей ядра (с запасом для медленных машин CI)
+IMPORT_BUDGET = 1.0
+
+# Импорт в отдельном процессе: модули не должны быть загружены заранее
+IMPORT_SCRIPT = """
+import json
+import sqlite3
+import sys
+import time
+
+connections = []
+original_connect = sqlite3.connect
+
+def counting_connect(*args, **kwargs):
+    connections.append(args)
+    return original_connect(*args, **kwargs)
+
+sqlite3.connect = counting_connect
+
+started = time.perf_counter()
+import bot.config
+import bot.database
+import bot.services.scheduler_instance
+import bot.services.history
+elapsed = time.perf_counter() - started
+
+print(json.dumps({
+    "elapsed": elapsed,
+    "connections": len(connections),
+    "modules": [name for name in ("holidays", "dotenv", "aiogram") if name in sys.modules],
+}))
+"""
+
+
+def run_import():
+    env = dict(os.environ, DB_PATH=os.path.join(ROOT, "tests", "must-not-exist.db"))
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_core_import_is_fast_and_side_effect_free():
+    report = run_import()
+
+    assert report["elapsed"] < IMPORT_BUDGET, f"импорт занял {report['elapsed']:.3f} сек."
+    assert report["connections"] == 0, "при импорте открыто подключение к SQLite"
+    assert report["modules"] == [], f"при импорте загружены {report['modules']}"
+    assert not os.path.exists(os.path.join(ROOT, "tests", "must-not-exist.db"))